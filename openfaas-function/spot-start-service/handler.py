@@ -2,7 +2,7 @@
 import json
 from loguru import logger
 from typing import Optional, Tuple
-from .portainer import PortainerAPIClient, ServiceManager
+from .portainer import PortainerAPIClient, ServiceManager, get_wakeup_status
 
 # Configure logger
 logger.add(
@@ -14,46 +14,20 @@ logger.add(
 )
 logger.info("Starting Spot Start Service function")
 
-# Example -> Service to stack mapping
-# TODO: Automatically populate this from Portainer API
-ENDPOINTS_CONFIG = {
-    "endpoints": {
-        "1": {
-            "name": "Example-Server-1",
-            "docker_version": "v1.xx",
-            "stacks": {
-                "101": "service-a",
-                "102": "service-b",
-                "103": "service-c",
-                "104": "service-d",
-                "105": "service-e",
-                "106": "service-f",
-                "107": "service-g",
-                "108": "service-h",
-            },
-        },
-        "2": {
-            "name": "Example-Server-2",
-            "docker_version": "v1.xx",
-            "stacks": {
-                "201": "service-z",
-            },
-        },
-    }
-}
+# Optional static service to stack mapping, see developer.md for the format.
+# Without constants.py, endpoints and stacks are discovered from Portainer.
+ENDPOINTS_CONFIG = None
 
 try:
     from .constants import PORTAINER_ENDPOINTS_CONFIG
 
     ENDPOINTS_CONFIG = PORTAINER_ENDPOINTS_CONFIG.copy()
-except ImportError as err_msg:
-    logger.exception(err_msg)
-    logger.exception(
-        "Failed to import constants.py. You may need to create it.")
-    raise err_msg
+except ImportError:
+    logger.info(
+        "No constants.py found, discovering endpoints and stacks from Portainer")
 
 
-def parse_event_body(event) -> Tuple[Optional[str], Optional[str]]:
+def parse_event_body(event) -> Tuple[Optional[str], Optional[str], bool]:
     """Get the body of the event"""
     # Parse request body if it exists
     request_body = {}
@@ -66,7 +40,9 @@ def parse_event_body(event) -> Tuple[Optional[str], Optional[str]]:
     # Check if service name is provided
     service_name = request_body.get("service")
     referral_url = request_body.get("referral_url")
-    return service_name, referral_url
+    # Return 202 right away and wake the service up in the background
+    run_async = bool(request_body.get("async", False))
+    return service_name, referral_url, run_async
 
 
 def build_response(
@@ -92,8 +68,29 @@ def format_event(event_handler) -> str:
     )
 
 
+def handle_status(event) -> dict:
+    """Report the status of an asynchronous wake-up (GET ?id=<wakeup_id>)"""
+    wakeup_id = (event.query or {}).get("id")
+    if not wakeup_id:
+        return build_response(
+            status_code=400,
+            body={"error": "Wake-up id is required"},
+        )
+
+    status = get_wakeup_status(wakeup_id)
+    if not status:
+        return build_response(
+            status_code=404,
+            body={"error": f"No wake-up found with id: {wakeup_id}"},
+        )
+    return build_response(body=status)
+
+
 def handle(event, context):
     """OpenFaaS handler function"""
+    if event.method == "GET":
+        return handle_status(event)
+
     if event.method != "POST":
         return build_response(
             status_code=405,
@@ -103,7 +100,7 @@ def handle(event, context):
     logger.info(f"Function invoked with event: {format_event(event)}")
 
     try:
-        service_name, referral_url = parse_event_body(event)
+        service_name, referral_url, run_async = parse_event_body(event)
         if not service_name and not referral_url:
             logger.error("No service name or referral URL provided")
             return build_response(
@@ -131,6 +128,12 @@ def handle(event, context):
                     },
                 )
 
+        if service_name and run_async:
+            # Start the service in the background
+            status = service_manager.start_service_async(service_name)
+            logger.success(f"Wake-up accepted: {status}")
+            return build_response(status_code=202, body=status)
+
         if service_name:
             # Start the service
             result = service_manager.start_service(service_name)
@@ -1,9 +1,22 @@
 #!/usr/bin/env python3
 import json
+import os
+import tempfile
+import threading
+import time
 import unittest
 from dotenv import load_dotenv
 from unittest.mock import patch, MagicMock
 from .handler import handle, PortainerAPIClient, ServiceManager
+from .portainer import (
+    clear_discovery_cache,
+    clear_domain_index,
+    clear_token_cache,
+    _save_wakeup,
+    _service_lock,
+    get_session,
+    get_wakeup_status,
+)
 
 load_dotenv()
 
@@ -93,17 +106,49 @@ class TestSpotStartService(unittest.TestCase):
         # Verify mocks
         mock_service_manager.return_value.start_service.assert_not_called()
 
-    @patch("portainer.requests")
-    def test_portainer_api_client_authenticate(self, mock_requests):
+    @patch("handler.PortainerAPIClient")
+    @patch("handler.ServiceManager")
+    def test_handle_async_request(self, mock_service_manager, mock_api_client):
+        """Test that async requests are accepted with a wake-up id"""
+        instance = mock_service_manager.return_value
+        instance.start_service_async.return_value = {
+            "wakeup_id": "abc",
+            "service": "nextcloud",
+            "status": "starting",
+            "elapsed": 0.0,
+        }
+
+        event = TestEvent(
+            method="POST", body={"service": "nextcloud", "async": True})
+        result = handle(event, {})
+
+        self.assertEqual(result["statusCode"], 202)
+        self.assertEqual(json.loads(result["body"])["wakeup_id"], "abc")
+        instance.start_service_async.assert_called_once_with("nextcloud")
+        instance.start_service.assert_not_called()
+
+    def test_handle_unknown_wakeup_status(self):
+        """Test that status requests for unknown wake-ups return 404"""
+        result = handle(TestEvent(method="GET", query={"id": "unknown"}), {})
+        self.assertEqual(result["statusCode"], 404)
+
+        result = handle(TestEvent(method="GET"), {})
+        self.assertEqual(result["statusCode"], 400)
+
+    def test_portainer_api_client_authenticate(self):
         """Test API client authentication"""
         # Setup mock
+        mock_session = MagicMock()
         mock_response = MagicMock()
         mock_response.json.return_value = {"jwt": "test_token"}
-        mock_requests.post.return_value = mock_response
+        mock_session.post.return_value = mock_response
 
         # Create client
         client = PortainerAPIClient(
-            base_url="https://test.com/api", username="user", password="pass"
+            base_url="https://test.com/api",
+            username="user",
+            password="pass",
+            session=mock_session,
         )
 
         # Call authenticate
@@ -112,7 +157,98 @@ class TestSpotStartService(unittest.TestCase):
         # Verify
         self.assertEqual(token, "test_token")
         self.assertEqual(client.jwt_token, "test_token")
-        mock_requests.post.assert_called_once()
+        mock_session.post.assert_called_once()
+
+    def test_portainer_api_client_reuses_cached_token(self):
+        """Test that clients share one JWT instead of re-authenticating"""
+        clear_token_cache()
+        mock_session = MagicMock()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"jwt": "test_token"}
+        mock_session.post.return_value = mock_response
+
+        # Each invocation creates its own client
+        for _ in range(3):
+            client = PortainerAPIClient(
+                base_url="https://test.com/api",
+                username="user",
+                password="pass",
+                session=mock_session,
+            )
+            headers = client.get_request_headers()
+
+        self.assertEqual(headers["Authorization"], "Bearer test_token")
+        mock_session.post.assert_called_once()
+
+    def test_portainer_api_client_reauthenticates_on_401(self):
+        """Test that a rejected JWT is refreshed and the request retried once"""
+        clear_token_cache()
+        mock_session = MagicMock()
+        auth_response = MagicMock()
+        auth_response.json.return_value = {"jwt": "new_token"}
+        mock_session.post.return_value = auth_response
+
+        rejected = MagicMock(status_code=401)
+        accepted = MagicMock(status_code=200)
+        accepted.json.return_value = [{"Id": "abc"}]
+        mock_session.request.side_effect = [rejected, accepted]
+
+        client = PortainerAPIClient(
+            base_url="https://test.com/api",
+            username="user",
+            password="pass",
+            session=mock_session,
+        )
+        client.jwt_token = "revoked_token"
+        client.jwt_expires_at = time.time() + 3600
+
+        containers = client.get_containers("1", "v1.24")
+
+        self.assertEqual(containers, [{"Id": "abc"}])
+        self.assertEqual(client.jwt_token, "new_token")
+        self.assertEqual(mock_session.request.call_count, 2)
+        mock_session.post.assert_called_once()
+
+    def test_portainer_api_client_shares_session(self):
+        """Test that clients reuse one pooled session that only retries reads"""
+        clients = [
+            PortainerAPIClient(
+                base_url="https://test.com/api", username="user", password="pass"
+            )
+            for _ in range(2)
+        ]
+
+        self.assertIs(clients[0].session, clients[1].session)
+        self.assertIs(clients[0].session, get_session())
+        retry = get_session().get_adapter("https://test.com").max_retries
+        self.assertIn("GET", retry.allowed_methods)
+        self.assertNotIn("POST", retry.allowed_methods)
+        self.assertIsNotNone(clients[0].timeout)
+
+    def test_portainer_api_client_get_containers_filters(self):
+        """Test that container filters are sent to the Docker API"""
+        mock_session = MagicMock()
+        mock_session.request.return_value = MagicMock(status_code=200)
+        mock_session.request.return_value.json.return_value = []
+        client = PortainerAPIClient(
+            base_url="https://test.com/api",
+            username="user",
+            password="pass",
+            session=mock_session,
+        )
+        client.jwt_token = "test_token"
+        client.jwt_expires_at = time.time() + 3600
+
+        client.get_containers(
+            "1", "v1.24", filters={"label": ["com.docker.compose.project=service-a"]}
+        )
+
+        params = mock_session.request.call_args.kwargs["params"]
+        self.assertEqual(params["all"], "true")
+        self.assertEqual(
+            json.loads(params["filters"]),
+            {"label": ["com.docker.compose.project=service-a"]},
+        )
 
     def test_service_manager_find_service(self):
         """Test finding service location"""
@@ -130,6 +266,287 @@ class TestSpotStartService(unittest.TestCase):
         location = manager.find_service_location("nonexistent")
         self.assertIsNone(location)
 
+    def test_service_manager_discovers_endpoints_and_stacks(self):
+        """Test finding services without a static endpoints configuration"""
+        clear_discovery_cache()
+        mock_client = MagicMock()
+        mock_client.get_endpoints.return_value = [
+            {
+                "Id": 3,
+                "Name": "docker-host",
+                "Type": 2,
+                "Snapshots": [
+                    {"DockerSnapshotRaw": {"Version": {"ApiVersion": "1.43"}}}
+                ],
+            },
+            {"Id": 4, "Name": "k8s-cluster", "Type": 5},
+        ]
+        mock_client.get_stacks.return_value = [
+            {"Id": 42, "Name": "nextcloud", "EndpointId": 3},
+            {"Id": 43, "Name": "k8s-app", "EndpointId": 4},
+        ]
+
+        # Each invocation creates its own manager
+        for _ in range(2):
+            manager = ServiceManager(mock_client)
+            location = manager.find_service_location("nextcloud")
+
+        self.assertEqual(location, ("3", "42"))
+        self.assertIsNone(manager.find_service_location("k8s-app"))
+        self.assertEqual(
+            manager._topology()["stacks"]["nextcloud"], ("3", "42", "v1.43")
+        )
+        mock_client.get_endpoints.assert_called_once()
+        mock_client.get_stacks.assert_called_once()
+
+    @patch("portainer.RESTART_MODE", "stack")
+    @patch("portainer.time.sleep")
+    def test_service_manager_start_service_waits_until_healthy(self, mock_sleep):
+        """Test that a restart polls container state instead of sleeping blindly"""
+        labels = {"com.docker.compose.project": "service-a"}
+        exited = [{"Labels": labels, "State": "exited", "Status": "Exited (0)"}]
+        starting = [
+            {"Labels": labels, "State": "running", "Status": "Up 1s (health: starting)"}
+        ]
+        healthy = [{"Labels": labels, "State": "running", "Status": "Up 9s (healthy)"}]
+
+        mock_client = MagicMock()
+        # Health check, stop poll, then two start polls
+        mock_client.get_containers.side_effect = [exited, exited, starting, healthy]
+        manager = ServiceManager(
+            mock_client, endpoints_config=ENDPOINTS_CONFIG)
+
+        result = manager.start_service("service-a")
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["action"], "restart")
+        self.assertTrue(result["healthy"])
+        self.assertIsNotNone(result["time_to_healthy"])
+        mock_client.stop_stack.assert_called_once_with("101", "1")
+        mock_client.start_stack.assert_called_once_with("101", "1")
+        mock_sleep.assert_called_once()
+
+    @patch("portainer.time.sleep")
+    def test_service_manager_start_service_restarts_only_failing_containers(
+        self, mock_sleep
+    ):
+        """Test that stopped/unhealthy containers are fixed without a stack restart"""
+        labels = {"com.docker.compose.project": "service-a"}
+        app = {"Id": "app", "Labels": labels, "State": "running", "Status": "Up 1h"}
+        broken = [
+            app,
+            {"Id": "redis", "Labels": labels, "State": "exited", "Status": "Exited (1)"},
+            {
+                "Id": "db",
+                "Labels": labels,
+                "State": "running",
+                "Status": "Up 1h (unhealthy)",
+            },
+        ]
+        fixed = [
+            app,
+            {"Id": "redis", "Labels": labels, "State": "running", "Status": "Up 2s"},
+            {"Id": "db", "Labels": labels, "State": "running", "Status": "Up 2s (healthy)"},
+        ]
+
+        mock_client = MagicMock()
+        # Health check, targeted restart, then one readiness poll
+        mock_client.get_containers.side_effect = [broken, broken, fixed]
+        manager = ServiceManager(
+            mock_client, endpoints_config=ENDPOINTS_CONFIG)
+
+        result = manager.start_service("service-a")
+
+        self.assertTrue(result["healthy"])
+        self.assertEqual(result["action"], "restart_containers")
+        mock_client.start_container.assert_called_once_with("redis", "1", "v1.xx")
+        mock_client.restart_container.assert_called_once_with("db", "1", "v1.xx")
+        mock_client.stop_stack.assert_not_called()
+        mock_client.start_stack.assert_not_called()
+
+    def test_service_manager_start_service_coalesces_concurrent_calls(self):
+        """Test that concurrent wake-ups of one service share a single restart"""
+        release = threading.Event()
+        manager = ServiceManager(
+            MagicMock(), endpoints_config=ENDPOINTS_CONFIG)
+
+        def slow_start(service_name):
+            release.wait(5)
+            return {"success": True, "action": "restart"}
+
+        with patch.object(
+            manager, "_start_service", side_effect=slow_start
+        ) as mock_start:
+            results = []
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(
+                        manager.start_service("service-a"))
+                )
+                for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        mock_start.assert_called_once_with("service-a")
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual(
+            sum(1 for result in results if result.get("coalesced")), 2)
+
+    def test_service_manager_start_service_async(self):
+        """Test that background wake-ups report their progress"""
+        release = threading.Event()
+        manager = ServiceManager(
+            MagicMock(), endpoints_config=ENDPOINTS_CONFIG)
+
+        def slow_start(service_name):
+            release.wait(5)
+            return {"success": True, "action": "restart", "healthy": True}
+
+        with patch.object(manager, "start_service", side_effect=slow_start):
+            status = manager.start_service_async("service-b")
+            self.assertEqual(status["status"], "starting")
+
+            # A second request joins the wake-up in progress
+            again = manager.start_service_async("service-b")
+            self.assertEqual(again["wakeup_id"], status["wakeup_id"])
+
+            release.set()
+            for _ in range(50):
+                current = get_wakeup_status(status["wakeup_id"])
+                if current["status"] != "starting":
+                    break
+                time.sleep(0.05)
+
+        self.assertEqual(current["status"], "healthy")
+        self.assertTrue(current["result"]["healthy"])
+        self.assertGreaterEqual(current["elapsed"], 0)
+
+    def test_service_manager_find_service_from_url(self):
+        """Test resolving a referral URL against every endpoint's containers"""
+        mock_client = MagicMock()
+
+        def get_containers(endpoint_id, docker_version, filters=None):
+            if endpoint_id == "1":
+                raise ConnectionError("endpoint offline")
+            return [
+                {"Labels": {"com.docker.compose.project": "other"}},
+                {
+                    "Labels": {
+                        "com.docker.compose.project": "service-z",
+                        "home.resolve.domain": "z.server.local",
+                    }
+                },
+            ]
+
+        clear_domain_index()
+        mock_client.get_containers.side_effect = get_containers
+        manager = ServiceManager(
+            mock_client, endpoints_config=ENDPOINTS_CONFIG)
+
+        self.assertEqual(
+            manager.find_service_from_url("https://z.server.local/login"),
+            "service-z",
+        )
+        self.assertIsNone(manager.find_service_from_url("unknown.server.local"))
+
+        # Both lookups were answered from the index built by the first one
+        self.assertEqual(mock_client.get_containers.call_count, 2)
+
+    def test_service_manager_find_service_from_wildcard_domain(self):
+        """Test that wildcard domain labels match subdomains"""
+        clear_domain_index()
+        mock_client = MagicMock()
+        mock_client.get_containers.return_value = [
+            {
+                "Labels": {
+                    "com.docker.compose.project": "service-a",
+                    "home.resolve.domain": "a.server.local, *.a.server.local",
+                }
+            },
+        ]
+        manager = ServiceManager(
+            mock_client, endpoints_config=ENDPOINTS_CONFIG)
+
+        self.assertEqual(
+            manager.find_service_from_url("https://a.server.local:8443"),
+            "service-a",
+        )
+        self.assertEqual(
+            manager.find_service_from_url("files.a.server.local"), "service-a"
+        )
+        self.assertIsNone(manager.find_service_from_url("b.server.local"))
+
+    def test_service_manager_domain_index_drops_removed_endpoints(self):
+        """Test that only failed endpoints still in the topology keep old entries"""
+        mock_client = MagicMock()
+        mock_client.get_containers.side_effect = ConnectionError("offline")
+        manager = ServiceManager(
+            mock_client, endpoints_config=ENDPOINTS_CONFIG)
+        previous = {
+            "built_at": 0,
+            "exact": {
+                "a.server.local": {
+                    "endpoint_id": "1", "stack_id": "101", "project": "service-a"
+                },
+                "gone.server.local": {
+                    "endpoint_id": "9", "stack_id": "901", "project": "gone"
+                },
+            },
+            "wildcard": {},
+        }
+
+        index = manager._build_domain_index(previous)
+
+        self.assertIn("a.server.local", index["exact"])
+        self.assertNotIn("gone.server.local", index["exact"])
+
+    def test_save_wakeup_sweeps_expired_status_files(self):
+        """Test that old status files of any replica are removed from LOCK_DIR"""
+        with tempfile.TemporaryDirectory() as lock_dir:
+            old_file = os.path.join(lock_dir, "wakeup-" + "0" * 32 + ".json")
+            with open(old_file, "w") as status_file:
+                status_file.write("{}")
+            os.utime(old_file, (0, 0))
+
+            with patch("portainer.LOCK_DIR", lock_dir):
+                _save_wakeup(
+                    {
+                        "wakeup_id": "1" * 32,
+                        "service": "service-a",
+                        "status": "starting",
+                        "started_at": time.time(),
+                        "finished_at": None,
+                        "result": None,
+                    }
+                )
+
+            self.assertEqual(
+                os.listdir(lock_dir), ["wakeup-" + "1" * 32 + ".json"])
+
+    def test_service_lock_creates_missing_lock_dir(self):
+        """Test that the service lock creates LOCK_DIR on first use"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lock_dir = os.path.join(tmp_dir, "locks")
+            with patch("portainer.LOCK_DIR", lock_dir):
+                with _service_lock("service-a"):
+                    pass
+            self.assertTrue(
+                os.path.exists(os.path.join(lock_dir, "service-a.lock")))
+
+    def test_service_lock_continues_without_usable_lock_dir(self):
+        """Test that an unusable LOCK_DIR does not block wake-ups"""
+        with tempfile.NamedTemporaryFile() as not_a_dir:
+            with patch("portainer.LOCK_DIR", not_a_dir.name):
+                with _service_lock("service-a"):
+                    entered = True
+        self.assertTrue(entered)
+
 
 if __name__ == "__main__":
     unittest.main()
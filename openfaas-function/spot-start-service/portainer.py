@@ -1,10 +1,386 @@
 #!/usr/bin/env python3
 import os
+import json
 import time
+import base64
+import fcntl
+import re
+import uuid
+import threading
 import requests
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from loguru import logger
 from urllib.parse import urlparse
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
+
+# Re-authenticate this many seconds before the cached JWT expires
+TOKEN_REFRESH_MARGIN = int(os.getenv("PORTAINER_TOKEN_REFRESH_MARGIN", "300"))
+# Optional file shared by function replicas to reuse the JWT across cold starts
+TOKEN_CACHE_FILE = os.getenv("PORTAINER_TOKEN_CACHE_FILE")
+# Portainer's default JWT lifetime, used when a token carries no "exp" claim
+DEFAULT_TOKEN_LIFETIME = 8 * 60 * 60
+
+# Connection pool and timeouts (seconds) of the shared HTTP session
+POOL_SIZE = int(os.getenv("PORTAINER_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("PORTAINER_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("PORTAINER_READ_TIMEOUT", "30"))
+# Retries (with exponential backoff) of idempotent calls on connection
+# errors and 502/503/504; POSTs such as stack start/stop are never retried
+MAX_RETRIES = int(os.getenv("PORTAINER_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.getenv("PORTAINER_RETRY_BACKOFF", "0.5"))
+
+# Seconds find_service_from_url waits for the endpoints' container lists
+ENDPOINT_TIMEOUT = float(os.getenv("PORTAINER_ENDPOINT_TIMEOUT", "10"))
+
+# Seconds before the domain -> service index is rebuilt, and the minimum
+# seconds between rebuilds triggered by a domain missing from the index
+DOMAIN_INDEX_TTL = float(os.getenv("PORTAINER_DOMAIN_INDEX_TTL", "300"))
+DOMAIN_INDEX_MISS_REFRESH = float(
+    os.getenv("PORTAINER_DOMAIN_INDEX_MISS_REFRESH", "30"))
+
+# Seconds before endpoints and stacks are re-discovered from Portainer
+DISCOVERY_TTL = float(os.getenv("PORTAINER_DISCOVERY_TTL", "300"))
+# Portainer endpoint types backed by Docker (local, agent, edge agent)
+DOCKER_ENDPOINT_TYPES = {1, 2, 4}
+
+# Seconds start_service waits for a restarted stack to become healthy, and
+# the adaptive polling interval (grows by POLL_BACKOFF up to POLL_MAX_INTERVAL)
+READY_TIMEOUT = float(os.getenv("PORTAINER_READY_TIMEOUT", "120"))
+POLL_INTERVAL = 0.5
+POLL_BACKOFF = 1.5
+POLL_MAX_INTERVAL = 5.0
+
+# "targeted" starts stopped and restarts unhealthy containers, falling back
+# to a stack restart if that does not make the service healthy within
+# TARGETED_TIMEOUT seconds; "stack" always restarts the whole stack
+RESTART_MODE = os.getenv("PORTAINER_RESTART_MODE", "targeted").lower()
+TARGETED_TIMEOUT = float(os.getenv("PORTAINER_TARGETED_TIMEOUT", "60"))
+
+# Optional directory, shared by all function replicas, holding one lock file
+# per service so only one replica wakes a service up at a time
+LOCK_DIR = os.getenv("PORTAINER_LOCK_DIR")
+
+# Seconds finished asynchronous wake-ups remain queryable
+WAKEUP_RETENTION = 3600
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# "username@base_url" -> (jwt, expires_at), shared by all clients in the process
+_token_cache: Dict[str, Tuple[str, float]] = {}
+_token_lock = threading.Lock()
+_auth_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Get the keep-alive HTTP session shared by all clients in the process
+
+    Returns:
+        requests.Session: Session with a pooled, retrying adapter
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+# `home.resolve.domain` label -> {"endpoint_id", "stack_id", "project"},
+# split into exact domains and "*.suffix" wildcards. Shared by all managers
+# in the process and swapped as a whole when rebuilt.
+_EMPTY_DOMAIN_INDEX = {"built_at": 0.0, "exact": {}, "wildcard": {}}
+_domain_index: Dict[str, Any] = _EMPTY_DOMAIN_INDEX
+_domain_index_lock = threading.Lock()
+
+
+# Endpoints and stacks discovered from Portainer (see _build_topology),
+# swapped as a whole when refreshed
+_EMPTY_TOPOLOGY = {"fetched_at": 0.0, "config": {"endpoints": {}}, "stacks": {}}
+_discovered_topology: Dict[str, Any] = _EMPTY_TOPOLOGY
+_discovery_lock = threading.Lock()
+
+
+def clear_discovery_cache() -> None:
+    """Forget the discovered endpoints and stacks"""
+    global _discovered_topology
+    _discovered_topology = _EMPTY_TOPOLOGY
+
+
+def _build_topology(endpoints_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Index an endpoints configuration by stack name
+
+    Returns:
+        Dict[str, Any]: {"fetched_at", "config", "stacks"} where "stacks" maps
+        stack name -> (endpoint_id, stack_id, docker_version)
+    """
+    stacks = {}
+    for endpoint_id, endpoint_info in endpoints_config["endpoints"].items():
+        docker_version = endpoint_info.get("docker_version", "v1.24")
+        for stack_id, stack_name in endpoint_info.get("stacks", {}).items():
+            if stack_name in stacks:
+                logger.warning(
+                    f"Stack '{stack_name}' exists on several endpoints, using endpoint {endpoint_id}"
+                )
+            stacks[stack_name] = (endpoint_id, stack_id, docker_version)
+
+    return {"fetched_at": time.time(), "config": endpoints_config, "stacks": stacks}
+
+
+def clear_domain_index() -> None:
+    """Forget the domain index so the next lookup rebuilds it"""
+    global _domain_index
+    _domain_index = _EMPTY_DOMAIN_INDEX
+
+
+def _lookup_domain(
+    index: Dict[str, Any], domains: List[str]
+) -> Optional[Dict[str, str]]:
+    """Find the service of the first known domain, exact before wildcard"""
+    for domain in domains:
+        entry = index["exact"].get(domain)
+        if entry:
+            return entry
+
+        # "a.b.example.com" matches "*.b.example.com", then "*.example.com", ...
+        parts = domain.split(".")
+        for i in range(1, len(parts)):
+            entry = index["wildcard"].get(".".join(parts[i:]))
+            if entry:
+                return entry
+    return None
+
+
+def _is_container_ready(container: Dict) -> bool:
+    """Whether a container is running and not failing or still starting its healthcheck"""
+    state = container.get("State", "").lower()
+    status = container.get("Status", "").lower()
+    return (
+        state == "running"
+        and "health: starting" not in status
+        and "unhealthy" not in status
+    )
+
+
+def _all_stopped(containers: List[Dict]) -> bool:
+    """Whether none of the containers is running"""
+    return not any(c.get("State", "").lower() == "running" for c in containers)
+
+
+def _all_ready(containers: List[Dict]) -> bool:
+    """Whether there are containers and all of them are ready"""
+    return bool(containers) and all(_is_container_ready(c) for c in containers)
+
+
+# Service name -> Future of the wake-up in progress in this process
+_wakeups: Dict[str, Future] = {}
+_wakeups_lock = threading.Lock()
+
+
+@contextmanager
+def _service_lock(service_name: str) -> Iterator[None]:
+    """
+    Hold the cross-replica file lock of a service, if LOCK_DIR is set
+
+    Waits at most as long as a wake-up may take, then proceeds without it.
+    Falls back to the in-process lock alone if LOCK_DIR is unusable.
+    """
+    if not LOCK_DIR:
+        yield
+        return
+
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", service_name)
+    try:
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        lock_file = open(os.path.join(LOCK_DIR, f"{safe_name}.lock"), "a")
+    except OSError as e:
+        logger.warning(
+            f"Failed to open the lock file of '{service_name}', continuing without it: {str(e)}"
+        )
+        yield
+        return
+
+    deadline = time.monotonic() + TARGETED_TIMEOUT + READY_TIMEOUT
+    with lock_file:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    logger.warning(
+                        f"Timed out waiting for the lock of '{service_name}', continuing"
+                    )
+                    break
+                time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Wake-up id -> {"wakeup_id", "service", "status", "started_at",
+# "finished_at", "result"} of asynchronous wake-ups. Mirrored to LOCK_DIR
+# when set, so any replica can answer status requests.
+_wakeup_status: Dict[str, Dict[str, Any]] = {}
+_wakeup_status_lock = threading.Lock()
+
+
+def _wakeup_file(wakeup_id: str) -> str:
+    """Path of a wake-up's status file in LOCK_DIR"""
+    return os.path.join(LOCK_DIR, f"wakeup-{wakeup_id}.json")
+
+
+def _save_wakeup(record: Dict[str, Any]) -> None:
+    """Store a wake-up's status and forget old finished ones"""
+    expired_before = time.time() - WAKEUP_RETENTION
+    with _wakeup_status_lock:
+        _wakeup_status[record["wakeup_id"]] = record
+        expired = [
+            wakeup_id
+            for wakeup_id, other in _wakeup_status.items()
+            if other["finished_at"] and other["finished_at"] < expired_before
+        ]
+        for wakeup_id in expired:
+            del _wakeup_status[wakeup_id]
+
+    if not LOCK_DIR:
+        return
+    try:
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        tmp_path = f"{_wakeup_file(record['wakeup_id'])}.tmp"
+        with open(tmp_path, "w") as tmp_file:
+            json.dump(record, tmp_file)
+        os.replace(tmp_path, _wakeup_file(record["wakeup_id"]))
+    except OSError as e:
+        logger.warning(f"Failed to write wake-up status: {str(e)}")
+        return
+    _sweep_wakeup_files(expired_before)
+
+
+def _sweep_wakeup_files(expired_before: float) -> None:
+    """
+    Remove wake-up status files in LOCK_DIR last written before expired_before
+
+    Covers files of other replicas and of previous processes, which are not
+    in this process' memory. Status files are rewritten when a wake-up
+    finishes, so only finished wake-ups get this old.
+    """
+    try:
+        with os.scandir(LOCK_DIR) as entries:
+            for entry in entries:
+                if not entry.name.startswith("wakeup-"):
+                    continue
+                try:
+                    if entry.stat().st_mtime < expired_before:
+                        os.remove(entry.path)
+                except OSError:
+                    # Removed concurrently by another replica
+                    continue
+    except OSError as e:
+        logger.warning(f"Failed to sweep wake-up status files: {str(e)}")
+
+
+def get_wakeup_status(wakeup_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the status of an asynchronous wake-up
+
+    Args:
+        wakeup_id: Id returned by ServiceManager.start_service_async
+
+    Returns:
+        Optional[Dict[str, Any]]: The wake-up's status ("starting", "healthy"
+        or "failed") with its elapsed seconds, None if unknown
+    """
+    with _wakeup_status_lock:
+        record = _wakeup_status.get(wakeup_id)
+
+    # Started by another replica
+    if record is None and LOCK_DIR and re.fullmatch(r"[0-9a-f]{32}", wakeup_id):
+        try:
+            with open(_wakeup_file(wakeup_id)) as status_file:
+                record = json.load(status_file)
+        except (OSError, ValueError):
+            pass
+
+    if record is None:
+        return None
+    finished_at = record["finished_at"] or time.time()
+    return {**record, "elapsed": round(finished_at - record["started_at"], 2)}
+
+
+def clear_token_cache() -> None:
+    """Forget all JWTs cached in this process"""
+    with _token_lock:
+        _token_cache.clear()
+
+
+def _token_expiry(token: str) -> float:
+    """Read the "exp" claim of a JWT without verifying it"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        if exp:
+            return float(exp)
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return time.time() + DEFAULT_TOKEN_LIFETIME
+
+
+def _read_token_file(cache_key: str) -> Optional[Tuple[str, float]]:
+    """Read a JWT from the on-disk token cache"""
+    try:
+        with open(f"{TOKEN_CACHE_FILE}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            with open(TOKEN_CACHE_FILE) as cache_file:
+                entry = json.load(cache_file).get(cache_key)
+    except (OSError, ValueError) as e:
+        logger.debug(f"No usable token cache file: {str(e)}")
+        return None
+
+    if not entry:
+        return None
+    return entry["jwt"], float(entry["expires_at"])
+
+
+def _write_token_file(cache_key: str, token: str, expires_at: float) -> None:
+    """Store a JWT in the on-disk token cache, readable by the owner only"""
+    try:
+        with open(f"{TOKEN_CACHE_FILE}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(TOKEN_CACHE_FILE) as cache_file:
+                    entries = json.load(cache_file)
+            except (OSError, ValueError):
+                entries = {}
+
+            entries[cache_key] = {"jwt": token, "expires_at": expires_at}
+            tmp_path = f"{TOKEN_CACHE_FILE}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(entries, tmp_file)
+            os.replace(tmp_path, TOKEN_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Failed to write token cache file: {str(e)}")
 
 
 class PortainerAPIClient:
@@ -15,12 +391,16 @@ class PortainerAPIClient:
         base_url: Optional[str] = None,
         username: Optional[str] = None,
         password: Optional[str] = None,
+        session: Optional[requests.Session] = None,
     ):
         self.base_url = base_url or os.getenv("PORTAINER_API_URL")
         self.username = username or os.getenv("PORTAINER_USERNAME")
         self.password = password or os.getenv("PORTAINER_PASSWORD")
         self.jwt_token = None
+        self.jwt_expires_at = 0.0
         self.verify_ssl = False
+        self.session = session or get_session()
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
 
         if not self.base_url or not self.username or not self.password:
             logger.error(
@@ -28,6 +408,9 @@ class PortainerAPIClient:
             raise ValueError(
                 "Portainer URL, username and password must be provided")
 
+        # Key of this client's JWT in the process and on-disk token caches
+        self.token_cache_key = f"{self.username}@{self.base_url}"
+
         logger.debug(
             f"PortainerAPIClient initialized with base URL: {self.base_url}")
 
@@ -47,8 +430,11 @@ class PortainerAPIClient:
         logger.info("Authenticating with Portainer API")
 
         try:
-            response = requests.post(
-                auth_endpoint, json=payload, verify=self.verify_ssl
+            response = self.session.post(
+                auth_endpoint,
+                json=payload,
+                verify=self.verify_ssl,
+                timeout=self.timeout,
             )
             response.raise_for_status()
             token = response.json().get("jwt")
@@ -58,7 +444,7 @@ class PortainerAPIClient:
                 raise ValueError(
                     "Authentication failed: No JWT token in response")
 
-            self.jwt_token = token
+            self._store_token(token)
             logger.success("Successfully authenticated with Portainer API")
             return token
 
@@ -66,28 +452,153 @@ class PortainerAPIClient:
             logger.error(f"Authentication failed: {str(e)}")
             raise
 
+    def _token_is_fresh(self, expires_at: float) -> bool:
+        """Whether a token expiring at `expires_at` can still be used"""
+        return expires_at - TOKEN_REFRESH_MARGIN > time.time()
+
+    def _store_token(self, token: str) -> None:
+        """Keep a new JWT on the client, in the process cache and on disk"""
+        expires_at = _token_expiry(token)
+        self.jwt_token = token
+        self.jwt_expires_at = expires_at
+
+        with _token_lock:
+            _token_cache[self.token_cache_key] = (token, expires_at)
+        if TOKEN_CACHE_FILE:
+            _write_token_file(self.token_cache_key, token, expires_at)
+
+    def _load_cached_token(self) -> bool:
+        """
+        Reuse a JWT cached by another client or replica
+
+        Returns:
+            bool: True if a token that is not about to expire was found
+        """
+        with _token_lock:
+            cached = _token_cache.get(self.token_cache_key)
+
+        if not (cached and self._token_is_fresh(cached[1])) and TOKEN_CACHE_FILE:
+            cached = _read_token_file(self.token_cache_key)
+            if cached:
+                with _token_lock:
+                    _token_cache[self.token_cache_key] = cached
+
+        if not (cached and self._token_is_fresh(cached[1])):
+            return False
+
+        self.jwt_token, self.jwt_expires_at = cached
+        logger.debug("Reusing cached Portainer JWT")
+        return True
+
     def get_request_headers(self) -> Dict[str, str]:
         """
         Get headers for authenticated API requests
 
+        The JWT is reused until shortly before it expires, then refreshed.
+
         Returns:
             Dict[str, str]: Headers including Authorization
         """
-        if not self.jwt_token:
-            self.authenticate()
+        if not (self.jwt_token and self._token_is_fresh(self.jwt_expires_at)):
+            # Only one client per process logs in, the others reuse its token
+            with _auth_lock:
+                if not self._load_cached_token():
+                    self.authenticate()
 
         return {
             "Authorization": f"Bearer {self.jwt_token}",
             "Accept": "application/json",
         }
 
-    def get_containers(self, endpoint_id: str, docker_version: str) -> List[Dict]:
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send an authenticated request, re-authenticating once on 401
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        response = self.session.request(
+            method,
+            url,
+            headers=self.get_request_headers(),
+            verify=self.verify_ssl,
+            timeout=self.timeout,
+            **kwargs,
+        )
+        if response.status_code == 401:
+            # The cached token was revoked or Portainer restarted
+            logger.warning("Portainer rejected the JWT, re-authenticating")
+            self.authenticate()
+            response = self.session.request(
+                method,
+                url,
+                headers=self.get_request_headers(),
+                verify=self.verify_ssl,
+                timeout=self.timeout,
+                **kwargs,
+            )
+
+        response.raise_for_status()
+        return response
+
+    def get_endpoints(self) -> List[Dict]:
+        """
+        Get all endpoints (environments) known to Portainer
+
+        Returns:
+            List[Dict]: List of endpoints
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        logger.info("Fetching endpoints")
+
+        try:
+            response = self._request("GET", f"{self.base_url}/api/endpoints")
+            endpoints = response.json()
+            logger.success(f"Successfully fetched {len(endpoints)} endpoints")
+            return endpoints
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to fetch endpoints: {str(e)}")
+            raise
+
+    def get_stacks(self) -> List[Dict]:
+        """
+        Get all stacks managed by Portainer
+
+        Returns:
+            List[Dict]: List of stacks
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        logger.info("Fetching stacks")
+
+        try:
+            response = self._request("GET", f"{self.base_url}/api/stacks")
+            stacks = response.json()
+            logger.success(f"Successfully fetched {len(stacks)} stacks")
+            return stacks
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to fetch stacks: {str(e)}")
+            raise
+
+    def get_containers(
+        self,
+        endpoint_id: str,
+        docker_version: str,
+        filters: Optional[Dict[str, List[str]]] = None,
+    ) -> List[Dict]:
         """
         Get all containers from a specific endpoint
 
         Args:
             endpoint_id: The endpoint ID
             docker_version: Docker API version
+            filters: Docker API filters applied server-side, e.g.
+                {"label": ["com.docker.compose.project=nextcloud"]}
 
         Returns:
             List[Dict]: List of containers
@@ -95,16 +606,15 @@ class PortainerAPIClient:
         Raises:
             requests.exceptions.RequestException: If the API request fails
         """
-        containers_url = f"{self.base_url}/api/endpoints/{endpoint_id}/docker/{docker_version}/containers/json?all=true"
-        logger.info(f"Fetching containers from endpoint {endpoint_id}")
+        containers_url = f"{self.base_url}/api/endpoints/{endpoint_id}/docker/{docker_version}/containers/json"
+        params = {"all": "true"}
+        if filters:
+            params["filters"] = json.dumps(filters)
+        logger.info(
+            f"Fetching containers from endpoint {endpoint_id} (filters={filters})")
 
         try:
-            response = requests.get(
-                containers_url,
-                headers=self.get_request_headers(),
-                verify=self.verify_ssl,
-            )
-            response.raise_for_status()
+            response = self._request("GET", containers_url, params=params)
             containers = response.json()
             logger.success(
                 f"Successfully fetched {len(containers)} containers")
@@ -136,13 +646,7 @@ class PortainerAPIClient:
         logger.info(f"Starting stack {stack_id} on endpoint {endpoint_id}")
 
         try:
-            response = requests.post(
-                stack_url,
-                headers=self.get_request_headers(),
-                data=params,
-                verify=self.verify_ssl,
-            )
-            response.raise_for_status()
+            self._request("POST", stack_url, data=params)
             logger.success(f"Stack {stack_id} started successfully")
             return True
 
@@ -172,13 +676,7 @@ class PortainerAPIClient:
         logger.info(f"Stopping stack {stack_id} on endpoint {endpoint_id}")
 
         try:
-            response = requests.post(
-                stack_url,
-                headers=self.get_request_headers(),
-                data=params,
-                verify=self.verify_ssl,
-            )
-            response.raise_for_status()
+            self._request("POST", stack_url, data=params)
             logger.success(f"Stack {stack_id} stopped successfully")
             return True
 
@@ -186,25 +684,165 @@ class PortainerAPIClient:
             logger.error(f"Failed to stop stack {stack_id}: {str(e)}")
             raise
 
+    def start_container(
+        self, container_id: str, endpoint_id: str, docker_version: str
+    ) -> bool:
+        """
+        Start a single container through Portainer's Docker proxy
+
+        Args:
+            container_id: The container ID
+            endpoint_id: The endpoint ID
+            docker_version: Docker API version
+
+        Returns:
+            bool: True if successful (or already started)
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        container_url = f"{self.base_url}/api/endpoints/{endpoint_id}/docker/{docker_version}/containers/{container_id}/start"
+        logger.info(
+            f"Starting container {container_id} on endpoint {endpoint_id}")
+
+        try:
+            self._request("POST", container_url)
+            logger.success(f"Container {container_id} started successfully")
+            return True
+
+        except requests.exceptions.RequestException as e:
+            logger.error(
+                f"Failed to start container {container_id}: {str(e)}")
+            raise
+
+    def restart_container(
+        self, container_id: str, endpoint_id: str, docker_version: str
+    ) -> bool:
+        """
+        Restart a single container through Portainer's Docker proxy
+
+        Args:
+            container_id: The container ID
+            endpoint_id: The endpoint ID
+            docker_version: Docker API version
+
+        Returns:
+            bool: True if successful
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        container_url = f"{self.base_url}/api/endpoints/{endpoint_id}/docker/{docker_version}/containers/{container_id}/restart"
+        logger.info(
+            f"Restarting container {container_id} on endpoint {endpoint_id}")
+
+        try:
+            self._request("POST", container_url)
+            logger.success(
+                f"Container {container_id} restarted successfully")
+            return True
+
+        except requests.exceptions.RequestException as e:
+            logger.error(
+                f"Failed to restart container {container_id}: {str(e)}")
+            raise
+
 
 class ServiceManager:
     """Manages service stack operations"""
 
     def __init__(
-        self, api_client: PortainerAPIClient, endpoints_config: Dict[str, Any]
+        self,
+        api_client: PortainerAPIClient,
+        endpoints_config: Optional[Dict[str, Any]] = None,
     ):
         """
         Initialize with API client
 
         Args:
             api_client: Portainer API client instance
+            endpoints_config: Static endpoint/stack mapping; discovered from
+                Portainer when omitted
         """
         self.api_client = api_client
         self.endpoints_config = endpoints_config
+        self._static_topology = (
+            _build_topology(endpoints_config) if endpoints_config else None
+        )
         logger.debug(
             f"ServiceManager initialized <api_client={api_client}, endpoints_config={endpoints_config}>"
         )
 
+    def _topology(self) -> Dict[str, Any]:
+        """
+        Get the endpoints and stacks, discovering them when no static
+        configuration was given and the cached discovery is older than
+        DISCOVERY_TTL
+
+        Returns:
+            Dict[str, Any]: See _build_topology
+        """
+        global _discovered_topology
+        if self._static_topology:
+            return self._static_topology
+
+        topology = _discovered_topology
+        if time.time() - topology["fetched_at"] < DISCOVERY_TTL:
+            return topology
+
+        with _discovery_lock:
+            # Another request refreshed the topology while this one waited
+            if _discovered_topology is not topology:
+                return _discovered_topology
+            try:
+                _discovered_topology = self._discover_topology()
+            except Exception as e:
+                if not topology["fetched_at"]:
+                    raise
+                logger.warning(
+                    f"Discovery failed, using previous endpoints: {str(e)}")
+            return _discovered_topology
+
+    def _discover_topology(self) -> Dict[str, Any]:
+        """
+        Discover Docker endpoints and their stacks through the Portainer API
+
+        Returns:
+            Dict[str, Any]: See _build_topology
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        endpoints = {}
+        for endpoint in self.api_client.get_endpoints():
+            if endpoint.get("Type") not in DOCKER_ENDPOINT_TYPES:
+                continue
+
+            # The Docker API version is part of Portainer's endpoint snapshot
+            docker_version = "v1.24"
+            snapshots = endpoint.get("Snapshots") or [{}]
+            raw_snapshot = snapshots[0].get("DockerSnapshotRaw") or {}
+            api_version = (raw_snapshot.get("Version") or {}).get("ApiVersion")
+            if api_version:
+                docker_version = f"v{api_version}"
+
+            endpoints[str(endpoint["Id"])] = {
+                "name": endpoint.get("Name", ""),
+                "docker_version": docker_version,
+                "stacks": {},
+            }
+
+        for stack in self.api_client.get_stacks():
+            endpoint_info = endpoints.get(str(stack.get("EndpointId")))
+            if endpoint_info is not None:
+                endpoint_info["stacks"][str(stack["Id"])] = stack["Name"]
+
+        topology = _build_topology({"endpoints": endpoints})
+        logger.success(
+            f"Discovered {len(topology['stacks'])} stacks on {len(endpoints)} endpoints"
+        )
+        return topology
+
     def find_service_location(self, service_name: str) -> Optional[Tuple[str, str]]:
         """
         Find endpoint ID and stack ID for a given service name
@@ -217,15 +855,13 @@ class ServiceManager:
         """
         logger.debug(f"Looking for service: {service_name}")
 
-        for endpoint_id, endpoint_info in self.endpoints_config["endpoints"].items():
-            stacks = endpoint_info.get("stacks", {})
-
-            for stack_id, stack_name in stacks.items():
-                if stack_name == service_name:
-                    logger.info(
-                        f"Found service '{service_name}' at endpoint {endpoint_id}, stack {stack_id}"
-                    )
-                    return (endpoint_id, stack_id)
+        location = self._topology()["stacks"].get(service_name)
+        if location:
+            endpoint_id, stack_id, _ = location
+            logger.info(
+                f"Found service '{service_name}' at endpoint {endpoint_id}, stack {stack_id}"
+            )
+            return (endpoint_id, stack_id)
 
         logger.warning(
             f"Service '{service_name}' not found in endpoints configuration")
@@ -249,21 +885,10 @@ class ServiceManager:
             return (False, None)
 
         endpoint_id, stack_id = service_location
-        endpoint_info = self.endpoints_config["endpoints"][endpoint_id]
-        docker_version = endpoint_info.get("docker_version", "v1.24")
 
         try:
-            containers = self.api_client.get_containers(
-                endpoint_id, docker_version)
-
-            # Filter containers belonging to this service/stack
-            service_containers = []
-            for container in containers:
-                labels = container.get("Labels", {})
-                project_name = labels.get("com.docker.compose.project")
-
-                if project_name == service_name:
-                    service_containers.append(container)
+            service_containers = self._get_service_containers(
+                service_name, endpoint_id)
 
             if not service_containers:
                 logger.warning(
@@ -273,10 +898,10 @@ class ServiceManager:
             # Check if all containers are healthy
             all_healthy = True
             for container in service_containers:
-                state = container.get("State", "").lower()
-                if state != "running" and not state.startswith("healthy"):
+                if not _is_container_ready(container):
                     logger.warning(
-                        f"Container {container.get('Names', ['unknown'])[0]} in state: {state}"
+                        f"Container {container.get('Names', ['unknown'])[0]} in state: "
+                        f"{container.get('State', '')} ({container.get('Status', '')})"
                     )
                     all_healthy = False
 
@@ -293,6 +918,112 @@ class ServiceManager:
         """
         Start a service if it's not running
 
+        Concurrent calls for the same service share one wake-up: in this
+        process they wait for its result, across replicas (with LOCK_DIR)
+        they wait for its lock and then find the service running.
+
+        Args:
+            service_name: Name of the service to start
+
+        Returns:
+            Dict[str, Any]: Response with status information
+        """
+        with _wakeups_lock:
+            wakeup = _wakeups.get(service_name)
+            is_leader = wakeup is None
+            if is_leader:
+                wakeup = _wakeups[service_name] = Future()
+
+        if not is_leader:
+            logger.info(
+                f"Joining the wake-up of '{service_name}' already in progress")
+            return {**wakeup.result(), "coalesced": True}
+
+        try:
+            with _service_lock(service_name):
+                result = self._start_service(service_name)
+            wakeup.set_result(result)
+            return result
+        except BaseException as e:
+            wakeup.set_exception(e)
+            raise
+        finally:
+            with _wakeups_lock:
+                _wakeups.pop(service_name, None)
+
+    def start_service_async(self, service_name: str) -> Dict[str, Any]:
+        """
+        Start a service in the background
+
+        A wake-up of the same service that is still in progress is reused.
+
+        Args:
+            service_name: Name of the service to start
+
+        Returns:
+            Dict[str, Any]: Initial wake-up status, see get_wakeup_status
+        """
+        with _wakeup_status_lock:
+            in_progress = next(
+                (
+                    other["wakeup_id"]
+                    for other in _wakeup_status.values()
+                    if other["service"] == service_name
+                    and other["status"] == "starting"
+                ),
+                None,
+            )
+            if in_progress is None:
+                record = {
+                    "wakeup_id": uuid.uuid4().hex,
+                    "service": service_name,
+                    "status": "starting",
+                    "started_at": time.time(),
+                    "finished_at": None,
+                    "result": None,
+                }
+                _wakeup_status[record["wakeup_id"]] = record
+
+        if in_progress is not None:
+            logger.info(f"Reusing wake-up {in_progress} of '{service_name}'")
+            return get_wakeup_status(in_progress)
+
+        _save_wakeup(record)
+        threading.Thread(
+            target=self._run_wakeup,
+            args=(record,),
+            name=f"wakeup-{service_name}",
+            daemon=True,
+        ).start()
+        logger.info(
+            f"Started wake-up {record['wakeup_id']} of '{service_name}'")
+        return get_wakeup_status(record["wakeup_id"])
+
+    def _run_wakeup(self, record: Dict[str, Any]) -> None:
+        """Run an asynchronous wake-up and record its outcome"""
+        try:
+            result = self.start_service(record["service"])
+        except Exception as e:
+            logger.exception(
+                f"Wake-up {record['wakeup_id']} failed: {str(e)}")
+            result = {"success": False,
+                      "message": f"Error starting service: {str(e)}"}
+
+        # "healthy" is absent when the service was already running
+        healthy = result.get("success", False) and result.get("healthy", True)
+        _save_wakeup(
+            {
+                **record,
+                "status": "healthy" if healthy else "failed",
+                "finished_at": time.time(),
+                "result": result,
+            }
+        )
+
+    def _start_service(self, service_name: str) -> Dict[str, Any]:
+        """
+        Start a service if it's not running, see start_service
+
         Args:
             service_name: Name of the service to start
 
@@ -329,23 +1060,49 @@ class ServiceManager:
                 f"Service '{service_name}' exists but is not healthy, restarting..."
             )
 
-            # Try to stop first, ignoring errors
-            try:
-                self.api_client.stop_stack(stack_id, endpoint_id)
-                time.sleep(5)  # Give it some time to stop
-            except Exception as e:
-                logger.warning(
-                    f"Error stopping service (continuing anyway): {str(e)}")
+            started_at = time.monotonic()
+            healthy = False
+            action = "restart"
 
-            # Start the service
-            self.api_client.start_stack(stack_id, endpoint_id)
+            # Fix only the failing containers first
+            if RESTART_MODE == "targeted":
+                healthy = self._restart_containers(
+                    service_name, endpoint_id, started_at + TARGETED_TIMEOUT
+                )
+                if healthy:
+                    action = "restart_containers"
+                else:
+                    logger.info(
+                        f"Targeted restart of '{service_name}' was not enough, restarting the stack"
+                    )
+
+            if not healthy:
+                healthy = self._restart_stack(
+                    service_name,
+                    endpoint_id,
+                    stack_id,
+                    time.monotonic() + READY_TIMEOUT,
+                )
+            elapsed = round(time.monotonic() - started_at, 2)
+
+            if healthy:
+                logger.success(
+                    f"Service '{service_name}' healthy after {elapsed}s")
+                message = f"Service '{service_name}' restarted successfully"
+            else:
+                # elapsed covers a failed targeted attempt plus the stack restart
+                logger.warning(
+                    f"Service '{service_name}' not healthy after {elapsed}s")
+                message = f"Service '{service_name}' restarted but not healthy after {elapsed}s"
 
             return {
                 "success": True,
-                "message": f"Service '{service_name}' restarted successfully",
-                "action": "restart",
+                "message": message,
+                "action": action,
                 "endpoint_id": endpoint_id,
                 "stack_id": stack_id,
+                "healthy": healthy,
+                "time_to_healthy": elapsed if healthy else None,
             }
 
         except Exception as e:
@@ -353,6 +1110,166 @@ class ServiceManager:
                 f"Error starting service '{service_name}': {str(e)}")
             return {"success": False, "message": f"Error starting service: {str(e)}"}
 
+    def _restart_containers(
+        self, service_name: str, endpoint_id: str, deadline: float
+    ) -> bool:
+        """
+        Start the stopped and restart the unhealthy containers of a service
+
+        Args:
+            service_name: Name of the service (compose project)
+            endpoint_id: The endpoint ID
+            deadline: time.monotonic() value after which waiting gives up
+
+        Returns:
+            bool: True if the service became healthy, False if it needs a
+            stack restart
+        """
+        docker_version = self._docker_version(endpoint_id)
+        try:
+            containers = self._get_service_containers(
+                service_name, endpoint_id)
+            if not containers:
+                # Nothing to start, the stack has to (re)create them
+                return False
+
+            for container in containers:
+                if _is_container_ready(container):
+                    continue
+
+                container_id = container["Id"]
+                state = container.get("State", "").lower()
+                status = container.get("Status", "").lower()
+                if state in ("exited", "created"):
+                    self.api_client.start_container(
+                        container_id, endpoint_id, docker_version)
+                elif state == "running" and "unhealthy" in status:
+                    self.api_client.restart_container(
+                        container_id, endpoint_id, docker_version)
+                elif state not in ("running", "restarting"):
+                    # Paused, dead or being removed
+                    logger.info(
+                        f"Container {container.get('Names', ['unknown'])[0]} is {state}"
+                    )
+                    return False
+                # Running containers still starting their healthcheck and
+                # containers Docker is restarting only need time
+
+        except Exception as e:
+            logger.warning(
+                f"Error restarting containers of '{service_name}': {str(e)}")
+            return False
+
+        return self._wait_for_service(
+            service_name, endpoint_id, _all_ready, deadline)
+
+    def _restart_stack(
+        self, service_name: str, endpoint_id: str, stack_id: str, deadline: float
+    ) -> bool:
+        """
+        Stop and start a service's whole stack
+
+        Args:
+            service_name: Name of the service (compose project)
+            endpoint_id: The endpoint ID
+            stack_id: The stack ID
+            deadline: time.monotonic() value after which waiting gives up
+
+        Returns:
+            bool: True if the service became healthy before the deadline
+
+        Raises:
+            requests.exceptions.RequestException: If the stack cannot be started
+        """
+        # Try to stop first, ignoring errors
+        try:
+            self.api_client.stop_stack(stack_id, endpoint_id)
+            # Wait until no container is running any more
+            if not self._wait_for_service(
+                service_name, endpoint_id, _all_stopped, deadline
+            ):
+                logger.warning(
+                    f"Service '{service_name}' did not stop in time, starting anyway"
+                )
+        except Exception as e:
+            logger.warning(
+                f"Error stopping service (continuing anyway): {str(e)}")
+
+        # Start the service and wait until all containers are healthy
+        self.api_client.start_stack(stack_id, endpoint_id)
+        return self._wait_for_service(
+            service_name, endpoint_id, _all_ready, deadline)
+
+    def _docker_version(self, endpoint_id: str) -> str:
+        """Docker API version of an endpoint"""
+        endpoint_info = self._topology()["config"]["endpoints"][endpoint_id]
+        return endpoint_info.get("docker_version", "v1.24")
+
+    def _get_service_containers(
+        self, service_name: str, endpoint_id: str
+    ) -> List[Dict]:
+        """
+        Get the containers of a compose project on an endpoint
+
+        Args:
+            service_name: Name of the service (compose project)
+            endpoint_id: The endpoint ID
+
+        Returns:
+            List[Dict]: The service's containers
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        containers = self.api_client.get_containers(
+            endpoint_id,
+            self._docker_version(endpoint_id),
+            filters={"label": [f"com.docker.compose.project={service_name}"]},
+        )
+
+        # Filter containers belonging to this service/stack (already
+        # done by Docker, kept in case the filter is not honoured)
+        return [
+            container
+            for container in containers
+            if (container.get("Labels") or {}).get("com.docker.compose.project")
+            == service_name
+        ]
+
+    def _wait_for_service(
+        self,
+        service_name: str,
+        endpoint_id: str,
+        condition: Callable[[List[Dict]], bool],
+        deadline: float,
+    ) -> bool:
+        """
+        Poll a service's containers with a growing interval until a condition holds
+
+        Args:
+            service_name: Name of the service (compose project)
+            endpoint_id: The endpoint ID
+            condition: Called with the service's containers
+            deadline: time.monotonic() value after which polling gives up
+
+        Returns:
+            bool: True if the condition was met before the deadline
+        """
+        interval = POLL_INTERVAL
+        while True:
+            try:
+                if condition(self._get_service_containers(service_name, endpoint_id)):
+                    return True
+            except Exception as e:
+                logger.warning(
+                    f"Error polling service '{service_name}': {str(e)}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
     def find_service_from_url(self, referral_url: str) -> Optional[str]:
         """Get the service name from the referral URL"""
         """
@@ -379,45 +1296,161 @@ class ServiceManager:
 
         logger.info(f"Looking for service with domain: {referral_domain}")
 
-        # Search all endpoints for a container with a matching domain label
-        for endpoint_id, endpoint_info in self.endpoints_config["endpoints"].items():
-            if service_name:
-                break
+        # Labels may or may not include the port
+        domains = [referral_domain]
+        if parsed_url.hostname and parsed_url.hostname != referral_domain:
+            domains.append(parsed_url.hostname)
 
-            docker_version = endpoint_info.get("docker_version", "v1.24")
-            try:
-                containers = self.api_client.get_containers(
-                    endpoint_id, docker_version)
-                for container in containers:
-                    labels: dict = container.get("Labels", {})
-                    domain_label: str = (
-                        labels.get("home.resolve.domain", "").lower().strip()
-                    )
-                    project_name: str = (
-                        labels.get("com.docker.compose.project",
-                                   "").lower().strip()
+        index = self._get_domain_index()
+        entry = _lookup_domain(index, domains)
+
+        # The service may have been deployed since the index was built
+        if not entry and time.time() - index["built_at"] > DOMAIN_INDEX_MISS_REFRESH:
+            entry = _lookup_domain(self._get_domain_index(force=True), domains)
+
+        if entry:
+            service_name = entry["project"]
+            logger.info(
+                f"Found matching service: {service_name} for domain {referral_domain}"
+            )
+        else:
+            logger.warning(f"No service found for domain: {referral_domain}")
+
+        return service_name
+
+    def _get_domain_index(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Get the domain index, rebuilding it when older than DOMAIN_INDEX_TTL
+
+        Args:
+            force: Rebuild even if the index has not expired yet
+
+        Returns:
+            Dict[str, Any]: The current domain index
+        """
+        global _domain_index
+        index = _domain_index
+        if not force and time.time() - index["built_at"] < DOMAIN_INDEX_TTL:
+            return index
+
+        with _domain_index_lock:
+            # Another request rebuilt the index while this one waited
+            if _domain_index is not index:
+                return _domain_index
+            _domain_index = self._build_domain_index(index)
+            return _domain_index
+
+    def _build_domain_index(self, previous: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the domain index from the containers of all endpoints
+
+        Endpoints are listed concurrently. Entries of endpoints that fail or
+        do not answer within ENDPOINT_TIMEOUT are carried over from the
+        previous index, unless the endpoint left the topology.
+
+        Args:
+            previous: The index being replaced
+
+        Returns:
+            Dict[str, Any]: The new domain index
+        """
+        endpoints = self._topology()["config"]["endpoints"]
+        logger.info(f"Building domain index from {len(endpoints)} endpoints")
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, len(endpoints)), thread_name_prefix="domain-index"
+        )
+        futures = {
+            executor.submit(self._index_endpoint, endpoint_id, endpoint_info): endpoint_id
+            for endpoint_id, endpoint_info in endpoints.items()
+        }
+        indexed = {}
+        try:
+            for future in as_completed(futures, timeout=ENDPOINT_TIMEOUT):
+                endpoint_id = futures[future]
+                try:
+                    indexed[endpoint_id] = future.result()
+                except Exception as e:
+                    logger.warning(
+                        f"Error fetching containers for endpoint {endpoint_id}: {str(e)}"
                     )
+        except FuturesTimeoutError:
+            pending = [futures[future] for future in futures if not future.done()]
+            logger.warning(
+                f"Endpoints {pending} did not answer within {ENDPOINT_TIMEOUT}s"
+            )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        index = {"built_at": time.time(), "exact": {}, "wildcard": {}}
+        for kind in ("exact", "wildcard"):
+            for pattern, entry in previous[kind].items():
+                endpoint_id = entry["endpoint_id"]
+                if endpoint_id in endpoints and endpoint_id not in indexed:
+                    index[kind][pattern] = entry
+        for patterns in indexed.values():
+            for pattern, entry in patterns:
+                if pattern.startswith("*."):
+                    index["wildcard"][pattern[2:]] = entry
+                else:
+                    index["exact"][pattern] = entry
+
+        logger.success(
+            f"Domain index built with {len(index['exact'])} domains and "
+            f"{len(index['wildcard'])} wildcards"
+        )
+        return index
+
+    def _index_endpoint(
+        self, endpoint_id: str, endpoint_info: Dict[str, Any]
+    ) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Collect the domain patterns of the containers on one endpoint
 
-                    # Skip if missing important labels
-                    if not domain_label or not project_name:
-                        continue
+        Args:
+            endpoint_id: The endpoint ID
+            endpoint_info: The endpoint's configuration
 
-                    # Try matching
-                    if domain_label == referral_domain:
-                        logger.info(
-                            f"Found exact matching service: {project_name} for domain {domain_label}"
-                        )
-                        service_name = project_name
-                        break
+        Returns:
+            List[Tuple[str, Dict[str, str]]]: (domain pattern, service) pairs
 
-            except Exception as e:
-                logger.warning(
-                    f"Error fetching containers for endpoint {endpoint_id}: {str(e)}"
-                )
-                logger.warning(f"Error-ed Entry - {container}")
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        docker_version = endpoint_info.get("docker_version", "v1.24")
+        stack_ids = {
+            stack_name.lower(): stack_id
+            for stack_id, stack_name in endpoint_info.get("stacks", {}).items()
+        }
+        # Only containers that carry a domain label
+        containers = self.api_client.get_containers(
+            endpoint_id, docker_version, filters={"label": ["home.resolve.domain"]}
+        )
+
+        patterns = []
+        for container in containers:
+            labels: dict = container.get("Labels") or {}
+            domain_label: str = (
+                labels.get("home.resolve.domain", "").lower().strip()
+            )
+            project_name: str = (
+                labels.get("com.docker.compose.project",
+                           "").lower().strip()
+            )
+
+            # Skip if missing important labels
+            if not domain_label or not project_name:
                 continue
 
-        if not service_name:
-            logger.warning(f"No service found for domain: {referral_domain}")
+            entry = {
+                "endpoint_id": endpoint_id,
+                "stack_id": stack_ids.get(project_name),
+                "project": project_name,
+            }
+            # A label may list several domains, e.g. "app.local,*.app.local"
+            for pattern in domain_label.split(","):
+                pattern = pattern.strip()
+                if pattern:
+                    patterns.append((pattern, entry))
 
-        return service_name
+        return patterns
@@ -4,6 +4,29 @@
 This engine integrates with gethomepage/homepage service API
 to provide search results for internal services and applications.
 
+A background thread polls homepage every `catalog_ttl` seconds with a
+conditional request (ETag / Last-Modified) and keeps the service catalog
+in memory together with an inverted index, so searches are pure in-memory
+lookups. If homepage is unreachable the last good catalog keeps being
+served. With `status_checks` enabled the same thread also polls each
+service's siteMonitor, ping or Docker status and results show the cached
+up/down state.
+
+The engine keeps no per-query module state: the query only lives in the
+`search()` call and each search reads one immutable catalog snapshot, so
+parallel searches cannot see each other's queries or a half-built index.
+
+Result objects, including resolved icon URLs, are built once per catalog
+refresh and only copied per search. Icon names homepage loads from a CDN
+(`mdi-`, `si-`, `sh-`, dashboard-icons) are only shown with `icon_cache`
+enabled: the refresher then downloads icons in parallel after swapping in
+the catalog and inlines them as data URIs, so browsers fetch neither the
+CDN nor the homepage host on every results page. Failed downloads are
+retried on the next refresh.
+
+Groups may be nested to any depth. Service widget payloads are dropped
+from the catalog, they are never searched.
+
 1. Copy file to `/usr/local/searxng/searx/engines/dashboard_services.py`
 2. Add the following configuration to your `settings.yml` file:
 
@@ -14,14 +37,28 @@ engines:
     shortcut: dash
     timeout: 10.0
     disabled: false
-    enable_http: true
+    enable_http: true  # homepage is usually served over plain HTTP
     enable_http2: true
+    catalog_ttl: 300  # Seconds between background catalog refreshes
+    status_checks: false  # Poll per-service up/down status on each refresh
+    icon_cache: false  # Inline icons as data URIs (needed for CDN icon names)
     weight: 0.5  # Higher priority than regular search engines
 
 For use with https://github.com/searxng/searxng
 """
 
+import base64
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from json import loads
+from urllib.parse import quote, urlencode
+
+from searx.network import get as http_get
+from searx.network import set_context_network_name
 
 # Point to your self-hosted homepage instance
 HOMEPAGE_BASE_URL = "http://X.X.X.X:3000"
@@ -37,134 +74,475 @@ about = {
 }
 
 # Engine configuration
-engine_type = "online"
+engine_type = "offline"
 categories = ["general"]
 disabled = False
 timeout = 10.0
 paging = False
-send_accept_language_header = False
 
 # API endpoint
 base_url = f"{HOMEPAGE_BASE_URL}/api/services"
 
-# Store the current query
-_current_query = ""
+# Seconds between background refreshes of the catalog
+catalog_ttl = 300
+
+# Poll homepage's per-service status endpoints after each refresh
+status_checks = False
+status_workers = 8
+
+# Download icons once and serve them inline instead of linking to them
+icon_cache = False
+icon_max_bytes = 65536
+icon_workers = 8
+
+# CDNs homepage itself uses for icon names without a path
+MDI_ICON_URL = "https://cdn.jsdelivr.net/npm/@mdi/svg@latest/svg/{}.svg"
+SI_ICON_URL = "https://cdn.jsdelivr.net/npm/simple-icons@latest/icons/{}.svg"
+SH_ICON_URL = "https://cdn.jsdelivr.net/gh/selfhst/icons/{}/{}"
+DASHBOARD_ICON_URL = "https://cdn.jsdelivr.net/gh/homarr-labs/dashboard-icons/{}/{}"
+
+# Relevance weight of each searchable field
+FIELD_WEIGHTS = {
+    "name": 10,  # Highest weight for name match
+    "description": 5,  # Medium weight for description match
+    "group": 3,  # Medium-low weight for group match
+    "server": 2,  # Lower weight for server/container matches
+    "container": 2,
+}
 
+# Keys whose (potentially large) values are not kept in the catalog
+SKIPPED_KEYS = {"widget", "widgets"}
 
-def request(query, params):
-    """Build the request parameters for the dashboard services API."""
-    global _current_query
-    _current_query = query.lower()  # Store for filtering in response
+# BM25 term frequency saturation and field length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
 
-    params["url"] = base_url
-    params["method"] = "GET"
-    params["headers"] = {
-        "Accept": "application/json",
-        "User-Agent": "SearXNG Dashboard Services Engine",
-    }
-    return params
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Engine name from settings.yml, selects the engine's network (set by init())
+_network_name = None
+
+# Background refresher thread, started once by init() or the first search
+_refresher = None
+_refresher_lock = threading.Lock()
+_catalog_loaded = threading.Event()
+
+# Cached service status: (group, service name) -> "up" / "down".
+# Replaced as a whole after every status pass.
+_status = {}
+
+# Icon URL -> data URI, only written by the refresher thread
+_icon_cache = {}
+
+# In-memory service catalog with its search index (see _build_index).
+# Never mutated in place: refreshes swap in a new dict.
+_catalog = {
+    "etag": None,
+    "last_modified": None,
+    "fetched_at": 0.0,
+    "entries": [],
+    "index": {"postings": {}, "idf": {}, "trigrams": {}, "vocab": []},
+}
+
+
+def init(engine_settings=None):
+    """Start the background refresher when SearXNG loads the engine."""
+    global _network_name
+    _network_name = (engine_settings or {}).get("name")
+    _start_refresher()
+    return True
 
 
-def response(resp):
-    """Parse the API response and return search results."""
-    global _current_query
+def search(query, params):
+    """Answer the query from the in-memory service catalog."""
+    query = query.lower().strip()
+    if not query:
+        return []
+
+    if not _catalog_loaded.is_set():
+        # Only the very first searches may wait, for the initial load
+        _start_refresher()
+        _catalog_loaded.wait(timeout)
+
+    catalog = _catalog
+    status = _status
     results = []
+    for entry_id, _score in _match_entries(query, catalog["index"]):
+        entry = catalog["entries"][entry_id]
+        # Copy, SearXNG annotates the result dicts it receives
+        result = dict(entry["result"])
+        service_status = status.get(_status_key(entry))
+        if service_status:
+            result["content"] += f" | Status: {service_status}"
+        results.append(result)
+    return results
+
+
+def _start_refresher():
+    """Start the refresher thread unless it is already running."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None and _refresher.is_alive():
+            return
+        _refresher = threading.Thread(
+            target=_refresh_loop, name="dashboard-services-refresh", daemon=True
+        )
+        _refresher.start()
+
+
+def _use_engine_network():
+    """Send this thread's searx.network requests through the engine's network.
+
+    The network is selected per thread, and threads the engine starts itself
+    would otherwise use SearXNG's default network (no plain HTTP, no
+    engine-specific proxies).
+    """
+    if _network_name:
+        set_context_network_name(_network_name)
+
+
+def _refresh_loop():
+    """Refresh the catalog (and statuses) every `catalog_ttl` seconds."""
+    _use_engine_network()
+    while True:
+        _refresh_catalog()
+        # Unblock searches after the first attempt, even if it failed; they
+        # do not wait for the (slower) icon and status passes
+        _catalog_loaded.set()
+        if icon_cache:
+            try:
+                _refresh_icons()
+            except Exception as e:
+                print(f"Dashboard Services Engine Icon Error: {e}")
+        if status_checks:
+            try:
+                _refresh_status()
+            except Exception as e:
+                # Keep the only refresher thread alive, statuses are optional
+                print(f"Dashboard Services Engine Status Error: {e}")
+        time.sleep(catalog_ttl)
+
+
+def _refresh_catalog():
+    """Fetch the services API, reusing the cached catalog on 304 or errors."""
+    global _catalog
+    headers = {
+        "Accept": "application/json",
+        "User-Agent": "SearXNG Dashboard Services Engine",
+    }
+    if _catalog["etag"]:
+        headers["If-None-Match"] = _catalog["etag"]
+    if _catalog["last_modified"]:
+        headers["If-Modified-Since"] = _catalog["last_modified"]
 
     try:
-        # Check if response is empty
+        resp = http_get(base_url, headers=headers, timeout=timeout)
+        if resp.status_code == 304:
+            _catalog = {**_catalog, "fetched_at": time.time()}
+            return
+
+        resp.raise_for_status()
         if not resp.text.strip():
             print("Dashboard Services Engine: Empty response")
-            return results
-
-        # Parse JSON response
-        json_data = loads(resp.text)
-
-        # Get the query for filtering
-        query = _current_query
-        if not query:
-            print("Dashboard Services Engine: No query available")
-            return results  # No query, no results
-
-        # Collect all matching services with their scores
-        matched_services = []
-
-        # Process each group in the response
-        for group in json_data:
-            group_name = group.get("name", "Unknown Group")
-
-            # Process direct services
-            if "services" in group:
-                for service in group["services"]:
-                    score = _calculate_match_score(service, group_name, query)
-                    if score > 0:  # Only include if there's a match
-                        matched_services.append(
-                            {
-                                "service": service,
-                                "group_name": group_name,
-                                "score": score,
-                            }
-                        )
-
-            # Process nested groups
-            if "groups" in group:
-                for subgroup in group["groups"]:
-                    subgroup_name = subgroup.get("name", "Unknown Subgroup")
-                    if "services" in subgroup:
-                        for service in subgroup["services"]:
-                            score = _calculate_match_score(
-                                service, f"{group_name} > {subgroup_name}", query
-                            )
-                            if score > 0:  # Only include if there's a match
-                                matched_services.append(
-                                    {
-                                        "service": service,
-                                        "group_name": f"{group_name} > {subgroup_name}",
-                                        "score": score,
-                                    }
-                                )
-
-        # Sort by score (highest first)
-        matched_services.sort(key=lambda x: x["score"], reverse=True)
-
-        # Create results from sorted matches
-        for match in matched_services:
-            results.append(
-                _create_service_result(match["service"], match["group_name"])
+            return
+
+        entries = _collect_entries(loads(resp.content))
+        for entry in entries:
+            entry["result"] = _create_service_result(
+                entry["service"], entry["group_name"]
             )
+        # Swap in a new catalog so readers never mix old and new entries
+        _catalog = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "entries": entries,
+            "index": _build_index(entries),
+        }
 
     except Exception as e:
+        # Keep serving the previous catalog until homepage is reachable again
         print(f"Dashboard Services Engine Error: {e}")
-        print(
-            f"Response content: {resp.text[:200]}..."
-        )  # Show first 200 chars for debugging
 
-    return results
 
+def _refresh_status():
+    """Poll every service's status endpoint and swap in the new statuses."""
+    global _status
+    entries = _catalog["entries"]
+    if not entries:
+        return
+
+    with ThreadPoolExecutor(
+        max_workers=status_workers, initializer=_use_engine_network
+    ) as pool:
+        statuses = pool.map(_check_status, entries)
+        _status = {
+            _status_key(entry): service_status
+            for entry, service_status in zip(entries, statuses)
+            if service_status
+        }
+
+
+def _status_key(entry):
+    """Key of an entry in the status cache."""
+    return entry.get("group"), entry["service"].get("name")
 
-def _calculate_match_score(service, group_name, query):
-    """Calculate a relevance score based on where the query matches."""
-    score = 0
 
-    # Get the values to check, converting to lowercase and handling None values
-    name = (service.get("name", "") or "").lower()
-    description = (service.get("description", "") or "").lower()
-    server = (service.get("server", "") or "").lower()
-    container = (service.get("container", "") or "").lower()
-    group_name = (group_name or "").lower()
+def _check_status(entry):
+    """Return "up", "down" or None (not monitored) for one service.
 
-    # Check for matches in different fields with different weights
-    if query in name:
-        score += 10  # Highest weight for name match
-    if query in description:
-        score += 5  # Medium weight for description match
-    if query in server:
-        score += 2  # Lower weight for server/container matches
-    if query in container:
-        score += 2
-    if query in group_name:
-        score += 3  # Medium-low weight for group match
+    Uses whatever homepage monitors for the service: siteMonitor, ping or
+    the Docker container status.
+    """
+    service = entry["service"]
+    api_base = base_url.rsplit("/services", 1)[0]
+    names = urlencode(
+        {"groupName": entry.get("group", ""), "serviceName": service.get("name", "")}
+    )
 
-    return score
+    try:
+        if service.get("siteMonitor"):
+            resp = http_get(f"{api_base}/siteMonitor?{names}", timeout=timeout)
+            code = resp.json().get("status") or 0
+            return "up" if 200 <= code < 400 else "down"
+
+        if service.get("ping"):
+            resp = http_get(f"{api_base}/ping?{names}", timeout=timeout)
+            data = resp.json()
+            alive = data.get("alive")
+            if alive is None:
+                alive = 200 <= (data.get("status") or 0) < 400
+            return "up" if alive else "down"
+
+        if service.get("container") and service.get("server"):
+            container = quote(service["container"], safe="")
+            server = quote(service["server"], safe="")
+            resp = http_get(
+                f"{api_base}/docker/status/{container}/{server}", timeout=timeout
+            )
+            data = resp.json()
+            running = data.get("status") == "running"
+            return "up" if running and data.get("health") != "unhealthy" else "down"
+
+    except Exception as e:
+        print(f"Dashboard Services Engine Status Error: {e}")
+        return "down"
+
+    return None
+
+
+def _collect_entries(json_data):
+    """Flatten groups nested to any depth into a list of services.
+
+    Traversal is iterative, so deeply nested configs cannot hit the
+    recursion limit; services keep their document order.
+    """
+    entries = []
+    # Stack of (group, its own name, "Parent > Child" name), reversed to
+    # preserve order
+    stack = [
+        (group, group.get("name", "Unknown Group"), group.get("name", "Unknown Group"))
+        for group in json_data
+    ]
+    stack.reverse()
+
+    while stack:
+        group, own_name, group_name = stack.pop()
+
+        # Process direct services; "group" is what homepage's status APIs expect
+        for service in group.get("services", []):
+            service = {k: v for k, v in service.items() if k not in SKIPPED_KEYS}
+            entries.append(
+                {"service": service, "group": own_name, "group_name": group_name}
+            )
+
+        # Process nested groups
+        subgroups = group.get("groups", [])
+        for subgroup in reversed(subgroups):
+            subgroup_name = subgroup.get("name", "Unknown Subgroup")
+            stack.append((subgroup, subgroup_name, f"{group_name} > {subgroup_name}"))
+
+    return entries
+
+
+def _tokenize(text):
+    """Split lowercased text into alphanumeric tokens."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _trigrams(token):
+    """Character trigrams of a token, padded so prefixes/suffixes count."""
+    padded = f"${token}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _entry_fields(entry):
+    """Searchable field values of a catalog entry."""
+    service = entry["service"]
+    return {
+        "name": service.get("name", ""),
+        "description": service.get("description", ""),
+        "group": entry["group_name"],
+        "server": service.get("server", ""),
+        "container": service.get("container", ""),
+    }
+
+
+def _build_index(entries):
+    """Build the BM25F-weighted inverted index and a trigram vocabulary index.
+
+    Postings hold, per token and entry, the field-weighted BM25 term
+    frequency component; `idf` holds the token's inverse document frequency.
+    """
+    tokenized = [
+        {field: _tokenize(value) for field, value in _entry_fields(entry).items()}
+        for entry in entries
+    ]
+    # Average token count per field, for BM25 length normalization
+    avg_len = {}
+    for field in FIELD_WEIGHTS:
+        total_tokens = sum(len(fields[field]) for fields in tokenized)
+        avg_len[field] = total_tokens / len(tokenized) if total_tokens else 1.0
+
+    postings = {}
+    for entry_id, fields in enumerate(tokenized):
+        for field, tokens in fields.items():
+            length_norm = 1 - BM25_B + BM25_B * len(tokens) / avg_len[field]
+            for token in set(tokens):
+                tf = tokens.count(token)
+                weight = (
+                    FIELD_WEIGHTS[field]
+                    * tf
+                    * (BM25_K1 + 1)
+                    / (tf + BM25_K1 * length_norm)
+                )
+                token_postings = postings.setdefault(token, {})
+                token_postings[entry_id] = token_postings.get(entry_id, 0.0) + weight
+
+    total = len(entries)
+    idf = {
+        token: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+        for token, docs in postings.items()
+    }
+
+    trigrams = {}
+    for token in postings:
+        for trigram in _trigrams(token):
+            trigrams.setdefault(trigram, set()).add(token)
+
+    return {
+        "postings": postings,
+        "idf": idf,
+        "trigrams": trigrams,
+        "vocab": sorted(postings),
+    }
+
+
+def _edit_distance(a, b, limit):
+    """Optimal string alignment distance, or `limit + 1` once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost
+            )
+            if (
+                previous2 is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _similar_tokens(query_token, index):
+    """Indexed tokens matching `query_token`, with a similarity in (0, 1].
+
+    Exact matches score 1.0, prefixes 0.9, other substrings 0.75 and
+    typos (1 edit for 4-7 characters, 2 edits from 8) up to 0.6.
+    """
+    vocab = index["vocab"]
+    matches = {}
+
+    # Prefix matches straight from the sorted vocabulary
+    position = bisect_left(vocab, query_token)
+    while position < len(vocab) and vocab[position].startswith(query_token):
+        token = vocab[position]
+        matches[token] = 1.0 if token == query_token else 0.9
+        position += 1
+
+    if len(query_token) < 3:
+        return matches
+
+    # Candidates sharing enough trigrams cover substrings and typos
+    query_trigrams = _trigrams(query_token)
+    shared = {}
+    for trigram in query_trigrams:
+        for token in index["trigrams"].get(trigram, ()):
+            shared[token] = shared.get(token, 0) + 1
+
+    max_edits = 0 if len(query_token) < 4 else 1 if len(query_token) < 8 else 2
+    min_shared = max(1, len(query_trigrams) - 3 * max(max_edits, 1))
+    for token, count in shared.items():
+        if token in matches or count < min_shared:
+            continue
+        if query_token in token:
+            matches[token] = 0.75
+        elif max_edits:
+            distance = _edit_distance(query_token, token, max_edits)
+            if distance <= max_edits:
+                matches[token] = 0.6 * (1 - distance / (len(query_token) + 1))
+    return matches
+
+
+def _match_entries(query, index):
+    """Score entries matching every query token, highest score first.
+
+    Each query token may match indexed tokens exactly, by prefix, as a
+    substring or with a typo. If the tokens do not all match, the query is
+    retried with spaces removed so "next cloud" still finds "nextcloud".
+    """
+    query_tokens = list(dict.fromkeys(_tokenize(query)))
+    scores = _score_tokens(query_tokens, index)
+    if not scores and len(query_tokens) > 1:
+        scores = _score_tokens(["".join(query_tokens)], index)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _score_tokens(query_tokens, index):
+    """BM25 scores of the entries matching all `query_tokens`."""
+    scores = None
+    for query_token in query_tokens:
+        token_scores = {}
+        for token, similarity in _similar_tokens(query_token, index).items():
+            boost = similarity * index["idf"][token]
+            for entry_id, weight in index["postings"][token].items():
+                # Count each entry once per query token, at its best match
+                score = boost * weight
+                if score > token_scores.get(entry_id, 0.0):
+                    token_scores[entry_id] = score
+
+        if scores is None:
+            scores = token_scores
+        else:
+            scores = {
+                entry_id: score + token_scores[entry_id]
+                for entry_id, score in scores.items()
+                if entry_id in token_scores
+            }
+        if not scores:
+            return {}
+    return scores or {}
 
 
 def _create_service_result(service, group_name):
@@ -190,11 +568,108 @@ def _create_service_result(service, group_name):
     }
 
     # Add icon if available
-    if icon:
-        if icon.startswith("http"):
-            result["img_src"] = icon
-        elif icon.startswith("/"):
-            # Local icon path
-            result["img_src"] = f"{HOMEPAGE_BASE_URL}{icon}"
+    img_src = _icon_src(icon)
+    if img_src:
+        result["img_src"] = img_src
 
     return result
+
+
+def _resolve_icon(icon):
+    """Resolve a homepage `icon` value to (image URL, whether it is on a CDN)."""
+    if not icon:
+        return None, False
+
+    if icon.startswith("http"):
+        return icon, False
+    if icon.startswith("/"):
+        # Local icon path
+        return f"{HOMEPAGE_BASE_URL}{icon}", False
+    if icon.startswith(("mdi-", "si-")):
+        # Material Design / Simple Icons, optionally with a "-#color" suffix
+        name = icon.split("-", 1)[1].split("-#", 1)[0]
+        template = MDI_ICON_URL if icon.startswith("mdi-") else SI_ICON_URL
+        return template.format(name), True
+
+    # selfh.st ("sh-") or dashboard-icons name, e.g. "sonarr.png"
+    name = icon[3:] if icon.startswith("sh-") else icon
+    if "." not in name:
+        name = f"{name}.png"
+    ext = name.rsplit(".", 1)[1]
+    template = SH_ICON_URL if icon.startswith("sh-") else DASHBOARD_ICON_URL
+    return template.format(ext, name), True
+
+
+def _icon_src(icon):
+    """Return the `img_src` of an icon: its data URI once inlined, else its URL.
+
+    CDN icons are left out until inlined, so results never make the browser
+    contact a third party.
+    """
+    url, on_cdn = _resolve_icon(icon)
+    if not url:
+        return None
+    if url in _icon_cache:
+        return _icon_cache[url]
+    return None if on_cdn else url
+
+
+def _refresh_icons():
+    """Inline the icons not cached yet and swap in results that use them.
+
+    Runs after every refresh, including 304s, so failed downloads are retried.
+    """
+    global _catalog
+    catalog = _catalog
+    missing = sorted(
+        {
+            url
+            for url, _on_cdn in (
+                _resolve_icon(entry["service"].get("icon", ""))
+                for entry in catalog["entries"]
+            )
+            if url and url not in _icon_cache
+        }
+    )
+    if not missing:
+        return
+
+    with ThreadPoolExecutor(
+        max_workers=icon_workers, initializer=_use_engine_network
+    ) as pool:
+        downloaded = {
+            url: data_uri
+            for url, data_uri in zip(missing, pool.map(_download_icon, missing))
+            if data_uri
+        }
+    if not downloaded:
+        return
+
+    _icon_cache.update(downloaded)
+    entries = []
+    for entry in catalog["entries"]:
+        url, _on_cdn = _resolve_icon(entry["service"].get("icon", ""))
+        if url in downloaded:
+            entry = {
+                **entry,
+                "result": _create_service_result(
+                    entry["service"], entry["group_name"]
+                ),
+            }
+        entries.append(entry)
+    # Same entries in the same order, so the search index stays valid
+    _catalog = {**catalog, "entries": entries}
+
+
+def _download_icon(url):
+    """Download an icon and return it as a data URI, or None on failure."""
+    try:
+        resp = http_get(url, timeout=timeout)
+        resp.raise_for_status()
+        content_type = resp.headers.get("Content-Type", "").split(";")[0]
+        if content_type.startswith("image/") and len(resp.content) <= icon_max_bytes:
+            encoded = base64.b64encode(resp.content).decode("ascii")
+            return f"data:{content_type};base64,{encoded}"
+    except Exception as e:
+        print(f"Dashboard Services Engine Icon Error: {e}")
+    return None
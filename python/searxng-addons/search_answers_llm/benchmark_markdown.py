@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark markdown rendering throughput for the langchain_llm plugin.
+
+Compares the old single shared converter (serialized behind a lock, which
+is the only safe way to share it) against one converter per thread, using
+the same "extra", "codehilite" and "toc" extensions as the plugin.
+
+Usage: python benchmark_markdown.py [--threads 8] [--answers 2000]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import markdown
+
+# Keep in sync with MARKDOWN_EXTENSIONS in plugins_langchain_llm.py
+MARKDOWN_EXTENSIONS = ["extra", "codehilite", "toc"]
+MARKDOWN_EXTENSION_CONFIGS = {"codehilite": {"css_class": "highlight"}}
+
+SAMPLE_ANSWER = """## Summary
+
+**SearXNG** is a *privacy-respecting* metasearch engine. Key points:
+
+- Aggregates results from [many engines](https://docs.searxng.org/)
+- Does not track or profile users
+- Can be self-hosted with Docker
+
+### Installation
+
+```bash
+docker run -d -p 8080:8080 searxng/searxng
+```
+
+| Feature | Supported |
+| ------- | --------- |
+| Plugins | Yes       |
+| Themes  | Yes       |
+
+1. Pull the image
+2. Configure `settings.yml`
+3. Restart the container
+"""
+
+
+def new_converter() -> markdown.Markdown:
+    return markdown.Markdown(
+        extensions=MARKDOWN_EXTENSIONS,
+        extension_configs=MARKDOWN_EXTENSION_CONFIGS,
+    )
+
+
+def bench_shared(threads: int, answers: int) -> float:
+    """Single converter shared by all threads, guarded by a lock."""
+    converter = new_converter()
+    lock = threading.Lock()
+
+    def render(_):
+        with lock:
+            html = converter.convert(SAMPLE_ANSWER)
+            converter.reset()
+        return html
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(render, range(answers)))
+    return time.perf_counter() - start
+
+
+def bench_thread_local(threads: int, answers: int) -> float:
+    """One converter per thread, as used by the plugin."""
+    local = threading.local()
+
+    def render(_):
+        converter = getattr(local, "converter", None)
+        if converter is None:
+            converter = local.converter = new_converter()
+        try:
+            return converter.convert(SAMPLE_ANSWER)
+        finally:
+            converter.reset()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(render, range(answers)))
+    return time.perf_counter() - start
+
+
+def bench_fresh(threads: int, answers: int) -> float:
+    """New converter per answer, the baseline without any reuse."""
+
+    def render(_):
+        return new_converter().convert(SAMPLE_ANSWER)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(render, range(answers)))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--answers", type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, bench in (
+        ("shared + lock", bench_shared),
+        ("thread-local", bench_thread_local),
+        ("fresh per answer", bench_fresh),
+    ):
+        elapsed = bench(args.threads, args.answers)
+        print(
+            f"{name:<18} {args.answers / elapsed:10.1f} answers/s "
+            f"({elapsed * 1000 / args.answers:.3f} ms/answer)"
+        )
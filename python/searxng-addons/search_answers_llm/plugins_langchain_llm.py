@@ -4,10 +4,62 @@
 Set LLM_MODEL_NAME, LLM_BASE_URL, LLM_API_KEY environment variables to
 configure the LLM model. Bind python/searxng-addons/search_answers_llm/llm_answer.html
 to your own template to customize the answer display.
+
+Rendered answers are cached per normalized query, language and context
+fingerprint. Tune the cache with LLM_ANSWER_CACHE_SIZE (entries kept in
+memory), LLM_ANSWER_CACHE_TTL (seconds), LLM_ANSWER_CACHE_DIR (optional
+on-disk tier shared across workers and restarts) and LLM_ANSWER_CACHE_DISK_MAX
+(files kept on disk; expired files are swept periodically).
+
+LLM calls run on a bounded worker pool. LLM_MAX_CONCURRENCY caps in-flight
+calls, LLM_MAX_PENDING caps queued plus running calls, LLM_QUEUE_TIMEOUT is
+how long a search waits for its answer and LLM_SHED_AFTER skips answers
+that sat in the queue longer than that many seconds.
+
+Search context is packed into LLM_CONTEXT_TOKEN_BUDGET estimated tokens,
+chosen from the top LLM_CONTEXT_CANDIDATES results by query-term overlap
+with near-duplicate snippets removed.
+
+Set LLM_STREAM_ANSWERS=true to stream tokens from the LLM. Partial answers
+are rendered one completed markdown block at a time; the final (and
+cached) answer is still converted as a whole, so reference links,
+footnotes and heading ids resolve across blocks.
+
+Langfuse traces are exported by a background flusher every
+LANGFUSE_FLUSH_INTERVAL seconds. At most LANGFUSE_MAX_PENDING traces wait
+for export; further LLM calls run untraced (and are counted as dropped)
+until the backlog drains.
+
+Set LLM_PREFETCH_ENABLED=true to pre-warm the answer cache for the top
+LLM_PREFETCH_TOP_N autocomplete suggestions while the user is still typing.
+Prefetches run one at a time in the background, only while the LLM pool has
+idle capacity, and are capped at LLM_PREFETCH_PER_MINUTE and
+LLM_PREFETCH_PER_HOUR calls.
+
+Navigational and trivial queries (bangs, URLs and domains, "github login",
+bare site names, arithmetic) are skipped by a local classifier. Queries
+scoring below LLM_ANSWER_MIN_SCORE are skipped too; LLM_CLASSIFIER_MODEL can
+point to a joblib-pickled text classifier with predict_proba for the scoring.
+
+Logging goes through the "searx.plugins.langchain_llm" logger. Each answered
+query logs one INFO line with per-stage timings (context search, prompt
+building, LLM call, markdown rendering) so slow stages are easy to spot.
 """
 from __future__ import annotations
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from os import environ
-import traceback
+import atexit
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import logging
+import time
 import typing
 import markdown
 
@@ -15,10 +67,16 @@ from searx.search.models import SearchQuery, EngineRef
 from searx.result_types import EngineResults, Answer
 from searx.plugins import Plugin, PluginInfo
 from flask_babel import gettext
+import flask
 from searx.search import Search
 from searx import engines
 from pydantic import SecretStr
 
+try:  # Optional, only needed for LLM_CLASSIFIER_MODEL
+    import joblib
+except ImportError:  # pragma: no cover - model scoring disabled
+    joblib = None
+
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 from langfuse.langchain import CallbackHandler as LangfuseLangchainCallbackHandler
@@ -30,13 +88,15 @@ if typing.TYPE_CHECKING:
     from searx.extended_types import SXNG_Request
     from searx.plugins import PluginCfg
 
+logger = logging.getLogger("searx.plugins.langchain_llm")
 
 try:
     langfuse = get_client()
     langchain_callback_handler = LangfuseLangchainCallbackHandler()
-    print("Langfuse client initialized successfully.")
+    tracing_enabled = True
+    logger.info("Langfuse client initialized successfully.")
 except Exception as exc:  # pragma: no cover - fallback when Langfuse is unavailable
-    print("Langfuse client initialization failed: %s. Tracing disabled.", exc)
+    logger.warning("Langfuse client initialization failed: %s. Tracing disabled.", exc)
 
     class _DummySpan:  # type: ignore
         def update(self, *_, **__):
@@ -64,6 +124,828 @@ except Exception as exc:  # pragma: no cover - fallback when Langfuse is unavail
 
     langfuse = _DummyLangfuse()
     langchain_callback_handler = _DummyCallbackHandler()
+    tracing_enabled = False
+
+
+class TraceFlusher:
+    """Export Langfuse traces from a daemon thread instead of the request path.
+
+    ``admit`` reserves a slot in a bounded buffer of traces awaiting export;
+    when the buffer is full the trace is dropped and counted instead of
+    blocking the search. A periodic flush drains the buffer and
+    ``shutdown`` (registered with atexit) exports whatever is left.
+    """
+
+    def __init__(
+        self, client: typing.Any, interval: float = 5.0, max_pending: int = 256
+    ) -> None:
+        self._client = client
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.stats = {"traced": 0, "flushed": 0, "dropped": 0, "errors": 0}
+        self._thread = threading.Thread(
+            target=self._run, name="langfuse-flusher", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def admit(self) -> bool:
+        """Reserve room for one trace; False means trace this call out."""
+        with self._lock:
+            if self._stopped.is_set() or self._pending >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            self._pending += 1
+            self.stats["traced"] += 1
+            if self._pending >= self.max_pending:
+                # Buffer is full, export now rather than at the next tick
+                self._wake.set()
+            return True
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, 0
+        if not pending:
+            return
+        try:
+            self._client.flush()
+            with self._lock:
+                self.stats["flushed"] += pending
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            logger.warning("Langfuse flush failed: %s", e)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the flusher thread and export any remaining traces."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._flush()
+        try:
+            self._client.shutdown()
+        except Exception as e:
+            logger.warning("Langfuse shutdown failed: %s", e)
+        logger.info("Langfuse flusher stopped: %s", self.stats)
+
+
+def _env_flag(name: str, default: str = "false") -> bool:
+    """Read a boolean feature flag from the environment."""
+    return environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+class QueryTimings:
+    """Wall-clock timings of the answer pipeline stages for one query.
+
+    Spans may still be recorded by a pool worker after the caller gave up
+    waiting, so stage updates and snapshots share a lock.
+    """
+
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: dict[str, float] = {}
+        self.tags: dict[str, typing.Any] = {}
+
+    @contextmanager
+    def span(self, stage: str) -> typing.Iterator[None]:
+        """Time a block; repeated spans of one stage are summed."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def metrics(self) -> dict:
+        """Stage durations in milliseconds plus any tags, for one log line."""
+        with self._lock:
+            stages = dict(self.stages)
+            tags = dict(self.tags)
+        metrics: dict[str, typing.Any] = {
+            f"{stage}_ms": round(elapsed, 1) for stage, elapsed in stages.items()
+        }
+        metrics["total_ms"] = round((time.perf_counter() - self._started) * 1000, 1)
+        metrics.update(tags)
+        return metrics
+
+    def log(self) -> None:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("answer metrics %s", json.dumps(self.metrics(), sort_keys=True))
+
+
+class QueryDecision(typing.NamedTuple):
+    """Outcome of QueryClassifier.classify."""
+
+    worthwhile: bool
+    score: float
+    reason: str
+
+
+class QueryClassifier:
+    """Cheap local check of whether a query deserves an LLM answer.
+
+    Hard rules reject bangs, URLs and bare domains, arithmetic, navigational
+    queries and bare site names. Remaining queries get a heuristic score
+    (question words, longer queries and technical terms score higher, a lone
+    brand name scores below the default threshold) or, when a model is
+    configured, the model's probability that an answer is useful.
+    """
+
+    QUESTION_WORDS = set(
+        "what why how who whom when where which is are can could does do should "
+        "explain difference vs versus compare best meaning define".split()
+    )
+    NAVIGATIONAL_TERMS = (
+        "login",
+        "log in",
+        "signin",
+        "sign in",
+        "signup",
+        "sign up",
+        "homepage",
+        "home page",
+        "official site",
+        "official website",
+        "my account",
+        "inbox",
+    )
+    NAVIGATIONAL_RE = re.compile(
+        r"\b(" + "|".join(re.escape(term) for term in NAVIGATIONAL_TERMS) + r")\b"
+    )
+    SITE_NAMES = set(
+        "amazon bing chatgpt discord ebay facebook github gmail google instagram "
+        "linkedin netflix outlook reddit spotify tiktok twitch twitter whatsapp "
+        "wikipedia yahoo youtube".split()
+    )
+    # Brands that double as words ("apple", "shell"), so scored, not rejected
+    BRAND_NAMES = set(
+        "adidas apple dropbox ikea nike paypal samsung shell slack steam uber "
+        "walmart zoom".split()
+    )
+    # A scheme, "www." or a path is required so "node.js" or "asp.net" pass
+    URL_RE = re.compile(
+        r"^(https?://\S+|www\.[\w-]+(\.[\w-]+)+(/\S*)?"
+        r"|[\w-]+(\.[\w-]+)*\.[a-z]{2,}/\S*)$",
+        re.I,
+    )
+    # A lone "name.tld"; tech names that look like domains are allowed through
+    DOMAIN_RE = re.compile(
+        r"^[\w-]+(\.[\w-]+)*\.(com|org|net|edu|gov|io|co|dev|app|me|tv|info|biz"
+        r"|de|uk|fr|nl|eu|ca|au|jp|ru|it|es|ch|se|us)$",
+        re.I,
+    )
+    DOMAIN_LIKE_TERMS = set("asp.net ado.net vb.net socket.io".split())
+    # At least one operator, so bare numbers like "1984" are not arithmetic
+    ARITHMETIC_RE = re.compile(r"^(?=.*[+\-*/^%=])[\d\s.,+\-*/()^%=]+$")
+    # Terms like "node.js", "c++", "c#" or "python3"
+    TECHNICAL_RE = re.compile(r"[a-z][\w-]*[.+#][\w.+#]*|[a-z]+\d")
+
+    def __init__(
+        self, min_score: float = 0.4, min_chars: int = 3, model_path: str = ""
+    ) -> None:
+        self.min_score = min_score
+        self.min_chars = min_chars
+        self.model = None
+        self.stats: dict[str, int] = {"checked": 0, "answered": 0}
+        self._lock = threading.Lock()
+
+        if model_path:
+            if joblib is None:
+                logger.warning("joblib is not installed, ignoring LLM_CLASSIFIER_MODEL")
+            else:
+                try:
+                    self.model = joblib.load(model_path)
+                except Exception as e:
+                    logger.warning("Failed to load query classifier model: %s", e)
+
+    def _rule_reason(self, query: str, raw_query: str) -> typing.Optional[str]:
+        words = query.split()
+        if len(query) < self.min_chars:
+            return "too_short"
+        if any(token.startswith("!") for token in raw_query.split()):
+            return "bang"
+        if self.URL_RE.match(query):
+            return "url"
+        if self.DOMAIN_RE.match(query) and query not in self.DOMAIN_LIKE_TERMS:
+            return "url"
+        if self.ARITHMETIC_RE.match(query):
+            return "arithmetic"
+        has_question = query.endswith("?") or bool(
+            self.QUESTION_WORDS.intersection(words)
+        )
+        if not has_question and self.NAVIGATIONAL_RE.search(query):
+            return "navigational"
+        if len(words) == 1 and words[0] in self.SITE_NAMES:
+            return "site_name"
+        return None
+
+    def _score(self, query: str) -> float:
+        if self.model is not None:
+            try:
+                return float(self.model.predict_proba([query])[0][1])
+            except Exception as e:
+                logger.warning("Query classifier model failed: %s", e)
+
+        words = query.split()
+        score = 0.4 + 0.1 * min(len(words) - 1, 3)
+        if len(words) == 1 and words[0] in self.BRAND_NAMES:
+            score -= 0.1
+        if query.endswith("?") or self.QUESTION_WORDS.intersection(words):
+            score += 0.3
+        if self.TECHNICAL_RE.search(query):
+            score += 0.1
+        return min(score, 1.0)
+
+    def classify(
+        self, query: str, raw_query: str = "", record_stats: bool = True
+    ) -> QueryDecision:
+        """Classify ``query``; ``raw_query`` is the text before bang parsing.
+
+        Pass ``record_stats=False`` for queries nobody searched for yet
+        (prefetch candidates), so they do not skew the skip statistics.
+        """
+        normalized = AnswerCache.normalize_query(query)
+        reason = self._rule_reason(normalized, raw_query or normalized)
+        if reason:
+            decision = QueryDecision(False, 0.0, reason)
+        else:
+            score = self._score(normalized)
+            worthwhile = score >= self.min_score
+            decision = QueryDecision(
+                worthwhile, score, "ok" if worthwhile else "low_score"
+            )
+
+        if not record_stats:
+            return decision
+
+        with self._lock:
+            self.stats["checked"] += 1
+            key = "answered" if decision.worthwhile else f"skipped_{decision.reason}"
+            self.stats[key] = self.stats.get(key, 0) + 1
+            if self.stats["checked"] % 100 == 0:
+                logger.info(
+                    "query classifier stats %s", json.dumps(self.stats, sort_keys=True)
+                )
+        return decision
+
+
+# Markdown extensions used to render answers (mirrored in benchmark_markdown.py)
+MARKDOWN_EXTENSIONS = ["extra", "codehilite", "toc"]
+MARKDOWN_EXTENSION_CONFIGS = {"codehilite": {"css_class": "highlight"}}
+
+
+class AnswerCache:
+    """Two-tier (memory LRU + optional disk) TTL cache for rendered answers.
+
+    Every ``sweep_every`` writes the disk tier is swept: expired files are
+    removed and at most ``max_disk_entries`` of the newest are kept.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        cache_dir: str = "",
+        max_disk_entries: int = 10000,
+        sweep_every: int = 100,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.sweep_every = sweep_every
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase and collapse whitespace so trivial variants share a key."""
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    @staticmethod
+    def context_fingerprint(search_context: list[dict], top_n: int = 5) -> str:
+        """Hash the URLs of the top results used as LLM context."""
+        urls = [item.get("url", "") for item in search_context[:top_n]]
+        return hashlib.sha256("\n".join(urls).encode("utf-8")).hexdigest()[:16]
+
+    def make_key(self, query: str, lang: str, search_context: list[dict]) -> str:
+        """Build the cache key from normalized query, language and context."""
+        raw = "\x1f".join(
+            [
+                self.normalize_query(query),
+                (lang or "").lower(),
+                self.context_fingerprint(search_context),
+            ]
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> typing.Optional[str]:
+        """Return the cached HTML for ``key`` or None when missing/expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        html = self._disk_get(key, now)
+        with self._lock:
+            if html is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return html
+
+    def set(self, key: str, html: str) -> None:
+        """Store rendered HTML for ``key`` in both tiers."""
+        created = time.time()
+        self._memory_set(key, created, html)
+        self._disk_set(key, created, html)
+
+    def _memory_set(self, key: str, created: float, html: str) -> None:
+        with self._lock:
+            self._entries[key] = (created, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_get(self, key: str, now: float) -> typing.Optional[str]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+        created = float(entry.get("created", 0))
+        if now - created > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        html = entry.get("html")
+        if not isinstance(html, str):
+            return None
+        # Promote to the memory tier so the next lookup skips the disk
+        self._memory_set(key, created, html)
+        return html
+
+    def _disk_set(self, key: str, created: float, html: str) -> None:
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump({"created": created, "html": html}, handle)
+            # Atomic rename so concurrent readers never see partial files
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write answer cache entry: %s", e)
+
+        with self._lock:
+            self._disk_writes += 1
+            due = self._disk_writes % self.sweep_every == 0
+        if due:
+            self._disk_sweep(time.time())
+
+    def _disk_sweep(self, now: float) -> None:
+        """Remove expired entries (and leftover temp files), then cap the count.
+
+        Entries that are never looked up again would otherwise stay on disk
+        forever. File modification times stand in for the creation time.
+        """
+        # One sweep at a time; concurrent writers just skip it
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            kept = []
+            removed = 0
+            with os.scandir(self.cache_dir) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith((".json", ".tmp")):
+                        continue
+                    try:
+                        mtime = dir_entry.stat().st_mtime
+                        if now - mtime > self.ttl:
+                            os.remove(dir_entry.path)
+                            removed += 1
+                        elif dir_entry.name.endswith(".json"):
+                            kept.append((mtime, dir_entry.path))
+                    except OSError:
+                        continue
+
+            if len(kept) > self.max_disk_entries:
+                kept.sort()
+                for _mtime, path in kept[: len(kept) - self.max_disk_entries]:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+
+            if removed:
+                logger.debug("Answer cache sweep removed %d files", removed)
+        except OSError as e:
+            logger.warning("Failed to sweep answer cache directory: %s", e)
+        finally:
+            self._sweep_lock.release()
+
+
+class LLMWorkerPool:
+    """Bounded executor for LLM calls with load shedding and single-flight."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_pending: int = 16,
+        queue_timeout: float = 15.0,
+        shed_after: float = 3.0,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.shed_after = shed_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="llm-worker"
+        )
+        self._inflight: dict[str, Future] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "coalesced": 0, "shed": 0, "timeouts": 0}
+
+    def is_busy(self) -> bool:
+        """True when every worker is taken by an in-flight call."""
+        with self._lock:
+            return self._pending >= self.max_concurrency
+
+    def run(
+        self, key: str, fn: typing.Callable[..., str], *args: typing.Any
+    ) -> typing.Optional[str]:
+        """Run ``fn(*args)`` on the pool, sharing the call with identical keys.
+
+        Returns None when the call was shed or did not finish within
+        ``queue_timeout``; in the latter case it keeps running in the
+        background so ``fn`` can still populate caches.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+            elif self._pending >= self.max_pending:
+                self.stats["shed"] += 1
+                logger.info("LLM queue full (%d), skipping answer", self._pending)
+                return None
+            else:
+                self._pending += 1
+                self.stats["submitted"] += 1
+                future = self._executor.submit(
+                    self._execute, key, time.monotonic(), fn, args
+                )
+                self._inflight[key] = future
+
+        try:
+            return future.result(timeout=self.queue_timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.stats["timeouts"] += 1
+            logger.info("LLM answer not ready after %ss", self.queue_timeout)
+            return None
+
+    def _execute(
+        self,
+        key: str,
+        submitted_at: float,
+        fn: typing.Callable[..., str],
+        args: tuple,
+    ) -> typing.Optional[str]:
+        try:
+            waited = time.monotonic() - submitted_at
+            if waited > self.shed_after:
+                with self._lock:
+                    self.stats["shed"] += 1
+                logger.info("LLM call queued %.2fs, shedding", waited)
+                return None
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._inflight.pop(key, None)
+
+
+class ContextPacker:
+    """Fill a token budget with the most relevant, non-redundant snippets."""
+
+    # Rough per-result prompt overhead ("Result N:", "Title:", "Source:" ...)
+    ITEM_TEMPLATE = "Result 00:\nTitle: {title}\nContent: \nSource: {engine}\n"
+
+    def __init__(
+        self,
+        token_budget: int = 800,
+        dedup_threshold: float = 0.7,
+        min_snippet_tokens: int = 16,
+    ) -> None:
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.min_snippet_tokens = min_snippet_tokens
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Cheap token estimate (~4 characters per token for English text)."""
+        return (len(text) + 3) // 4
+
+    @staticmethod
+    def _terms(text: str) -> list[str]:
+        return re.findall(r"\w+", text.lower())
+
+    @staticmethod
+    def _shingles(terms: list[str], size: int = 3) -> set[tuple[str, ...]]:
+        if len(terms) < size:
+            return {tuple(terms)} if terms else set()
+        return {tuple(terms[i : i + size]) for i in range(len(terms) - size + 1)}
+
+    @staticmethod
+    def _jaccard(a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def _trim(self, text: str, max_tokens: int) -> str:
+        """Cut ``text`` to roughly ``max_tokens`` at a sentence or word boundary."""
+        if self.estimate_tokens(text) <= max_tokens:
+            return text
+        cut = text[: max(0, max_tokens * 4 - 3)]
+        boundary = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+        if boundary > len(cut) // 2:
+            return cut[: boundary + 1]
+        return cut.rsplit(" ", 1)[0] + "..."
+
+    def pack(self, query: str, candidates: list[dict]) -> list[dict]:
+        """Select, dedupe and trim ``candidates`` to fit the token budget."""
+        query_terms = {term for term in self._terms(query) if len(term) > 1}
+
+        ranked = []
+        for rank, item in enumerate(candidates):
+            title = item.get("title", "") or ""
+            content = item.get("content", "") or ""
+            terms = self._terms(f"{title} {content}")
+            shingles = self._shingles(self._terms(content or title))
+            overlap = (
+                len(query_terms.intersection(terms)) / len(query_terms)
+                if query_terms
+                else 0.0
+            )
+            # Ties keep the engines' original ordering
+            ranked.append((-overlap, rank, item, shingles))
+        ranked.sort(key=lambda entry: (entry[0], entry[1]))
+
+        packed: list[dict] = []
+        kept_shingles: list[set] = []
+        used = 0
+        for _, _, item, shingles in ranked:
+            if any(
+                self._jaccard(shingles, kept) >= self.dedup_threshold
+                for kept in kept_shingles
+            ):
+                continue
+
+            overhead = self.estimate_tokens(
+                self.ITEM_TEMPLATE.format(
+                    title=item.get("title", ""), engine=item.get("engine", "")
+                )
+            )
+            remaining = self.token_budget - used - overhead
+            if remaining < self.min_snippet_tokens:
+                continue
+
+            content = self._trim(item.get("content", "") or "", remaining)
+            packed.append({**item, "content": content})
+            kept_shingles.append(shingles)
+            used += overhead + self.estimate_tokens(content)
+
+        return packed
+
+
+class AnswerPrefetcher:
+    """Low-priority background queue that pre-warms the answer cache.
+
+    Suggestions are processed by a single daemon thread that yields to
+    user-facing LLM calls, spaces calls to stay under ``per_minute`` and
+    drops work once ``per_hour`` calls were spent in the last hour.
+    """
+
+    def __init__(
+        self,
+        warm: typing.Callable[[str, str], None],
+        is_busy: typing.Callable[[], bool],
+        per_minute: int = 6,
+        per_hour: int = 60,
+        max_queue: int = 32,
+        recent_ttl: float = 600.0,
+    ) -> None:
+        self._warm = warm
+        self._is_busy = is_busy
+        self.min_interval = 60.0 / max(per_minute, 1)
+        self.per_hour = per_hour
+        self.recent_ttl = recent_ttl
+        self._queue: queue.Queue[tuple[str, str]] = queue.Queue(maxsize=max_queue)
+        self._recent: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._calls: deque[float] = deque()
+        self._last_call = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "warmed": 0, "skipped": 0, "over_budget": 0}
+        self._thread = threading.Thread(
+            target=self._run, name="llm-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def offer(self, query: str, lang: str) -> bool:
+        """Queue ``query`` for prefetching unless it was offered recently."""
+        key = (AnswerCache.normalize_query(query), lang)
+        now = time.monotonic()
+        with self._lock:
+            while self._recent:
+                oldest_key, offered_at = next(iter(self._recent.items()))
+                if now - offered_at <= self.recent_ttl:
+                    break
+                del self._recent[oldest_key]
+            if key in self._recent:
+                return False
+            try:
+                self._queue.put_nowait((query, lang))
+            except queue.Full:
+                self.stats["skipped"] += 1
+                return False
+            self._recent[key] = now
+            self.stats["queued"] += 1
+            return True
+
+    def _within_budget(self, now: float) -> bool:
+        while self._calls and now - self._calls[0] > 3600:
+            self._calls.popleft()
+        return len(self._calls) < self.per_hour
+
+    def _run(self) -> None:
+        while True:
+            query, lang = self._queue.get()
+            # User-facing searches always take precedence over speculation
+            while self._is_busy():
+                time.sleep(0.5)
+
+            wait = self._last_call + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            now = time.monotonic()
+            with self._lock:
+                if not self._within_budget(now):
+                    self.stats["over_budget"] += 1
+                    continue
+                self._calls.append(now)
+            self._last_call = now
+
+            try:
+                self._warm(query, lang)
+                with self._lock:
+                    self.stats["warmed"] += 1
+            except Exception as e:
+                logger.warning("Prefetch failed for %r: %s", query, e)
+
+
+class IncrementalMarkdownRenderer:
+    """Convert streamed markdown to HTML one completed block at a time.
+
+    A block is complete once a blank line is followed by text that cannot
+    continue it (lists keep absorbing items and indented lines), when a
+    top-level code fence closes, or when an ATX heading line ends. Each
+    block is converted exactly once, so CPU per token stays flat.
+    """
+
+    FENCE_RE = re.compile(r"^(\s*)(`{3,}|~{3,})")
+    LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+    HEADING_RE = re.compile(r"^#{1,6}\s")
+
+    def __init__(self, convert: typing.Callable[[str], str]) -> None:
+        self._convert = convert
+        self._partial_line = ""
+        self._block: list[str] = []
+        self._fence: typing.Optional[str] = None
+        self._blank_pending = False
+        self._html_blocks: list[str] = []
+
+    @property
+    def html(self) -> str:
+        """HTML for every block completed so far."""
+        return "\n".join(self._html_blocks)
+
+    def feed(self, text: str) -> str:
+        """Add streamed text; return the HTML of blocks it completed."""
+        self._partial_line += text
+        *lines, self._partial_line = self._partial_line.split("\n")
+        completed = len(self._html_blocks)
+        for line in lines:
+            self._push_line(line)
+        return "\n".join(self._html_blocks[completed:])
+
+    def snapshot(self) -> str:
+        """Render everything received so far, closing an open code fence."""
+        pending = self._block + ([self._partial_line] if self._partial_line else [])
+        if self._fence:
+            pending = pending + [self._fence]
+        if not pending:
+            return self.html
+        return "\n".join(self._html_blocks + [self._convert("\n".join(pending))])
+
+    def finish(self) -> str:
+        """Flush the remaining text and return the HTML of the final blocks."""
+        completed = len(self._html_blocks)
+        if self._partial_line:
+            self._push_line(self._partial_line)
+            self._partial_line = ""
+        if self._fence:
+            # Close a fence the model never terminated
+            self._block.append(self._fence)
+            self._fence = None
+        self._flush()
+        return "\n".join(self._html_blocks[completed:])
+
+    def _is_list_block(self) -> bool:
+        return any(self.LIST_ITEM_RE.match(line) for line in self._block)
+
+    def _flush(self) -> None:
+        while self._block and not self._block[-1].strip():
+            self._block.pop()
+        if self._block:
+            self._html_blocks.append(self._convert("\n".join(self._block)))
+        self._block = []
+        self._blank_pending = False
+
+    def _push_line(self, line: str) -> None:
+        fence_match = self.FENCE_RE.match(line)
+
+        if self._fence:
+            self._block.append(line)
+            if fence_match and fence_match.group(2).startswith(self._fence):
+                top_level = not fence_match.group(1) and not self._is_list_block()
+                self._fence = None
+                if top_level:
+                    self._flush()
+            return
+
+        if not line.strip():
+            self._blank_pending = bool(self._block)
+            if self._block:
+                self._block.append(line)
+            return
+
+        if self._blank_pending:
+            continues_list = self._is_list_block() and (
+                self.LIST_ITEM_RE.match(line) or line[:1] in (" ", "\t")
+            )
+            if not continues_list:
+                self._flush()
+            self._blank_pending = False
+
+        if self.HEADING_RE.match(line) and not self._is_list_block():
+            self._flush()
+            self._block.append(line)
+            self._flush()
+            return
+
+        if fence_match:
+            self._fence = fence_match.group(2)
+        self._block.append(line)
 
 
 class SXNGPlugin(Plugin):
@@ -73,7 +955,7 @@ class SXNGPlugin(Plugin):
 
     def __init__(self, plg_cfg: "PluginCfg") -> None:
         super().__init__(plg_cfg)
-        print(f"[DEBUG] LangChain plugin initialized with active={plg_cfg.active}")
+        logger.debug("LangChain plugin initialized with active=%s", plg_cfg.active)
 
         self.info = PluginInfo(
             id=self.id,
@@ -94,78 +976,225 @@ class SXNGPlugin(Plugin):
             api_key=SecretStr(environ.get("LLM_API_KEY", "dummy-key")),
         )
 
-        # Initialize markdown converter with common extensions
-        self.md_converter = markdown.Markdown(
-            extensions=["extra", "codehilite", "toc"],
-            extension_configs={"codehilite": {"css_class": "highlight"}},
+        # Skip navigational and trivial queries before spending an LLM call
+        self.query_classifier = QueryClassifier(
+            min_score=float(environ.get("LLM_ANSWER_MIN_SCORE", "0.4")),
+            model_path=environ.get("LLM_CLASSIFIER_MODEL", ""),
+        )
+
+        # Export traces in the background, off the search request path
+        self.trace_flusher = TraceFlusher(
+            langfuse,
+            interval=float(environ.get("LANGFUSE_FLUSH_INTERVAL", "5")),
+            max_pending=int(environ.get("LANGFUSE_MAX_PENDING", "256")),
+        )
+
+        # Cache rendered answers so repeated queries skip the LLM call
+        self.answer_cache = AnswerCache(
+            max_entries=int(environ.get("LLM_ANSWER_CACHE_SIZE", "256")),
+            ttl=float(environ.get("LLM_ANSWER_CACHE_TTL", "3600")),
+            cache_dir=environ.get("LLM_ANSWER_CACHE_DIR", ""),
+            max_disk_entries=int(environ.get("LLM_ANSWER_CACHE_DISK_MAX", "10000")),
+        )
+
+        # Pack the most relevant search snippets into a fixed token budget
+        self.context_packer = ContextPacker(
+            token_budget=int(environ.get("LLM_CONTEXT_TOKEN_BUDGET", "800")),
+        )
+        self.context_candidates = int(environ.get("LLM_CONTEXT_CANDIDATES", "10"))
+
+        # Bound concurrent LLM calls so bursts cannot exhaust SearXNG's workers
+        self.llm_pool = LLMWorkerPool(
+            max_concurrency=int(environ.get("LLM_MAX_CONCURRENCY", "4")),
+            max_pending=int(environ.get("LLM_MAX_PENDING", "16")),
+            queue_timeout=float(environ.get("LLM_QUEUE_TIMEOUT", "15")),
+            shed_after=float(environ.get("LLM_SHED_AFTER", "3")),
+        )
+
+        # Optionally pre-warm answers for likely queries from autocomplete
+        self.prefetcher: typing.Optional[AnswerPrefetcher] = None
+        if _env_flag("LLM_PREFETCH_ENABLED"):
+            self.prefetch_top_n = int(environ.get("LLM_PREFETCH_TOP_N", "1"))
+            self.prefetch_min_chars = int(environ.get("LLM_PREFETCH_MIN_CHARS", "4"))
+            self.prefetcher = AnswerPrefetcher(
+                warm=self._prefetch_answer,
+                is_busy=self.llm_pool.is_busy,
+                per_minute=int(environ.get("LLM_PREFETCH_PER_MINUTE", "6")),
+                per_hour=int(environ.get("LLM_PREFETCH_PER_HOUR", "60")),
+                recent_ttl=self.answer_cache.ttl,
+            )
+
+        # Markdown converters keep per-document state (TOC, footnotes, ...),
+        # so every thread gets its own pre-configured instance
+        self._md_local = threading.local()
+        self.stream_answers = _env_flag("LLM_STREAM_ANSWERS")
+
+    def init(self, app: "flask.Flask") -> bool:
+        """Watch autocomplete responses when speculative prefetching is on."""
+        if self.prefetcher is not None:
+            app.after_request(self._observe_autocomplete)
+        return True
+
+    def _observe_autocomplete(self, response: "flask.Response") -> "flask.Response":
+        """Queue high-confidence autocomplete suggestions for prefetching."""
+        try:
+            if flask.request.endpoint != "autocompleter" or response.status_code != 200:
+                return response
+
+            typed = (flask.request.values.get("q") or "").strip()
+            if len(typed) < self.prefetch_min_chars:
+                return response
+
+            payload = response.get_json(silent=True)
+            # OpenSearch format is [query, [suggestions]], otherwise a plain list
+            if (
+                isinstance(payload, list)
+                and len(payload) == 2
+                and isinstance(payload[1], list)
+            ):
+                payload = payload[1]
+            if not isinstance(payload, list):
+                return response
+
+            preferences = getattr(flask.request, "preferences", None)
+            lang = preferences.get_value("language") if preferences else "all"
+
+            # Only the top suggestions that extend what the user typed
+            for suggestion in payload[: self.prefetch_top_n]:
+                if (
+                    isinstance(suggestion, str)
+                    and suggestion.lower().startswith(typed.lower())
+                    and self.query_classifier.classify(
+                        suggestion, record_stats=False
+                    ).worthwhile
+                ):
+                    if self.prefetcher.offer(suggestion, lang):
+                        logger.debug("Queued prefetch for: %s", suggestion)
+        except Exception as e:
+            logger.warning("Error observing autocomplete: %s", e)
+        return response
+
+    def _prefetch_answer(self, query: str, lang: str) -> None:
+        """Generate and cache the answer for ``query`` ahead of the search."""
+        timings = QueryTimings()
+        timings.tags["prefetch"] = True
+        with timings.span("context_search"):
+            search_context = self._get_search_context(query)
+        cache_key = self.answer_cache.make_key(query, lang, search_context)
+        if self.answer_cache.get(cache_key):
+            return
+        self.llm_pool.run(
+            cache_key,
+            self._generate_and_cache_answer_html,
+            cache_key,
+            query,
+            search_context,
+            timings,
         )
+        timings.log()
 
     def post_search(
         self, request: "SXNG_Request", search: "SearchWithPlugins"
     ) -> EngineResults:
         results = EngineResults()
 
-        print(f"[DEBUG] post_search called for query: {search.search_query.query}")
-
         # Only process on first page
         if search.search_query.pageno > 1:
-            print("[DEBUG] Skipping, not on first page.")
+            logger.debug("Skipping, not on first page.")
             return results
 
         query = search.search_query.query
-        print(f"[DEBUG] Processing query: {query}")
+        lang = search.search_query.lang
+        timings = QueryTimings()
+
+        decision = self.query_classifier.classify(query, request.form.get("q", ""))
+        if not decision.worthwhile:
+            logger.debug(
+                "Skipping LLM answer for %r (%s, score=%.2f)",
+                query,
+                decision.reason,
+                decision.score,
+            )
+            timings.tags["skipped"] = decision.reason
+            timings.log()
+            return results
+
+        logger.debug("Processing query: %s", query)
 
         try:
             # Get search context from Google and DuckDuckGo
-            search_context = self._get_search_context(query)
-
-            if search_context:
-                print(
-                    f"[DEBUG] Retrieved {len(search_context)} search results for context"
-                )
-                # Generate LLM response with search context
-                llm_answer_html = self._generate_contextual_answer_html(
-                    query, search_context
-                )
-                if llm_answer_html:
-                    print("[DEBUG] Generated contextual HTML answer")
+            with timings.span("context_search"):
+                search_context = self._get_search_context(query)
+            has_context = bool(search_context)
+            timings.tags["context_items"] = len(search_context)
+            cache_key = self.answer_cache.make_key(query, lang, search_context)
+
+            with timings.span("cache_lookup"):
+                llm_answer_html = self.answer_cache.get(cache_key)
+            timings.tags["cache_hit"] = bool(llm_answer_html)
+            if llm_answer_html:
+                logger.debug("Answer cache hit")
+            else:
+                # Identical in-flight queries share one LLM call
+                with timings.span("answer"):
+                    llm_answer_html = self.llm_pool.run(
+                        cache_key,
+                        self._generate_and_cache_answer_html,
+                        cache_key,
+                        query,
+                        search_context,
+                        timings,
+                    )
 
-                    # Wrap the answer with data attributes for the template to use
-                    wrapped_answer = f"""<div data-model-name="{self.model_name}" data-has-context="true">{llm_answer_html}</div>"""
+            if llm_answer_html:
+                # Wrap the answer with data attributes for the template to use
+                wrapped_answer = f"""<div data-model-name="{self.model_name}" data-has-context="{str(has_context).lower()}">{llm_answer_html}</div>"""
 
-                    # Create Answer with custom template
-                    answer = Answer(
-                        answer=wrapped_answer,
-                        template="answer/llm_answer.html",
-                    )
-                    results.add(answer)
-                    print("[DEBUG] Added HTML Answer to results")
-                else:
-                    print("[DEBUG] No contextual answer generated")
-            else:
-                print(
-                    "[DEBUG] No search context retrieved, falling back to simple answer"
+                # Create Answer with custom template
+                answer = Answer(
+                    answer=wrapped_answer,
+                    template="answer/llm_answer.html",
                 )
-                # Fallback to simple answer if no search context
-                simple_answer_html = self._generate_simple_answer_html(query)
-                if simple_answer_html:
-                    # Wrap the answer with data attributes for the template to use
-                    wrapped_answer = f"""<div data-model-name="{self.model_name}" data-has-context="false">{simple_answer_html}</div>"""
-
-                    answer = Answer(
-                        answer=wrapped_answer, template="answer/llm_answer.html"
-                    )
-                    results.add(answer)
+                results.add(answer)
+                logger.debug("Added HTML Answer to results")
+            else:
+                logger.debug("No answer generated")
 
+            timings.log()
         except Exception as e:
-            print(f"[DEBUG] Exception in post_search: {e}")
-            traceback.print_exc()
+            logger.exception("Exception in post_search: %s", e)
 
         return results
 
+    def _generate_and_cache_answer_html(
+        self,
+        cache_key: str,
+        query: str,
+        search_context: list[dict],
+        timings: QueryTimings,
+    ) -> str:
+        """Generate the answer and store it, even if the caller stopped waiting."""
+        answer_html = self._generate_answer_html(query, search_context, timings)
+        if answer_html:
+            self.answer_cache.set(cache_key, answer_html)
+        return answer_html
+
+    def _generate_answer_html(
+        self, query: str, search_context: list[dict], timings: QueryTimings
+    ) -> str:
+        """Generate the answer HTML, using search context when available."""
+        if search_context:
+            logger.debug("Retrieved %d search results for context", len(search_context))
+            # Generate LLM response with search context
+            return self._generate_contextual_answer_html(query, search_context, timings)
+
+        logger.debug("No search context retrieved, falling back to simple answer")
+        # Fallback to simple answer if no search context
+        return self._generate_simple_answer_html(query, timings)
+
     def _get_search_context(self, query: str) -> list[dict]:
         """Fetch search results from Google and DuckDuckGo for context."""
-        print(f"[DEBUG] Fetching search context for: {query}")
+        logger.debug("Fetching search context for: %s", query)
 
         try:
             # Create engine references for Google and DuckDuckGo
@@ -174,15 +1203,15 @@ class SXNGPlugin(Plugin):
             # Check if Google is available and enabled
             if "google" in engines.engines:
                 engine_refs.append(EngineRef("google", "general"))
-                print("[DEBUG] Added Google engine")
+                logger.debug("Added Google engine")
 
             # Check if DuckDuckGo is available and enabled
             if "duckduckgo" in engines.engines:
                 engine_refs.append(EngineRef("duckduckgo", "general"))
-                print("[DEBUG] Added DuckDuckGo engine")
+                logger.debug("Added DuckDuckGo engine")
 
             if not engine_refs:
-                print("[DEBUG] No suitable engines found")
+                logger.debug("No suitable engines found")
                 return []
 
             # Create a search query for just these engines
@@ -195,7 +1224,7 @@ class SXNGPlugin(Plugin):
                 timeout_limit=5.0,  # 5 second timeout for context search
             )
 
-            print(f"[DEBUG] Created SearchQuery with {len(engine_refs)} engines")
+            logger.debug("Created SearchQuery with %d engines", len(engine_refs))
 
             # Execute the search
             context_search = Search(context_search_query)
@@ -203,11 +1232,11 @@ class SXNGPlugin(Plugin):
 
             # Extract relevant results
             ordered_results = context_results.get_ordered_results()
-            print(f"[DEBUG] Retrieved {len(ordered_results)} raw results")
+            logger.debug("Retrieved %d raw results", len(ordered_results))
 
             # Convert to simplified format for LLM context
-            search_context = []
-            for i, result in enumerate(ordered_results[:5]):  # Top 5 results
+            candidates = []
+            for i, result in enumerate(ordered_results[: self.context_candidates]):
                 try:
                     context_item = {
                         "title": getattr(result, "title", ""),
@@ -218,110 +1247,201 @@ class SXNGPlugin(Plugin):
 
                     # Filter out empty results
                     if context_item["title"] or context_item["content"]:
-                        search_context.append(context_item)
-                        print(
-                            f"[DEBUG] Added result {i+1}: {context_item['title'][:50]}..."
+                        candidates.append(context_item)
+                        logger.debug(
+                            "Added result %d: %.50s...", i + 1, context_item["title"]
                         )
 
                 except Exception as e:
-                    print(f"[DEBUG] Error processing result {i}: {e}")
+                    logger.debug("Error processing result %d: %s", i, e)
                     continue
 
-            print(f"[DEBUG] Final search context: {len(search_context)} items")
+            # Keep the most relevant, non-redundant snippets within the budget
+            search_context = self.context_packer.pack(query, candidates)
+            logger.debug(
+                "Final search context: %d of %d items",
+                len(search_context),
+                len(candidates),
+            )
             return search_context
 
         except Exception as e:
-            print(f"[DEBUG] Error in _get_search_context: {e}")
-
-            traceback.print_exc()
+            logger.exception("Error in _get_search_context: %s", e)
             return []
 
     def _generate_contextual_answer_html(
-        self, query: str, search_context: list[dict]
+        self, query: str, search_context: list[dict], timings: QueryTimings
     ) -> str:
         """Generate LLM answer with markdown formatting using search results as context."""
-        print(f"[DEBUG] Generating contextual markdown answer for: {query}")
+        logger.debug("Generating contextual markdown answer for: %s", query)
 
         try:
             # Use the pre-initialized ChatOpenAI instance
             llm = self.llm
 
-            # Prepare context from search results
-            context_text = self._format_search_context(search_context)
-
-            # Create messages with search context - Updated to request markdown
-            messages = [
-                SystemMessage(
-                    content="""You are a helpful Search Engine assistant that provides accurate answers and sources based on search results.
-                    Use extractive summarization to identify key information from search results and avoid fillers.
-                    Identify the most important information and links from the search results.
-                    Format your response using Markdown syntax for better readability.
-                    Keep the response concise but well-formatted in Markdown."""
-                ),
-                HumanMessage(
-                    content=f"""Query: {query}
-
-Search Results Context:
-{context_text}
-
-Based on the search results above, provide a helpful and accurate answer to the query using Markdown formatting. If the search results don't contain relevant information, say so and provide what general knowledge you can."""
-                ),
-            ]
+            with timings.span("prompt_build"):
+                messages = self._build_contextual_messages(query, search_context)
 
             # Generate response
-            response = llm.invoke(messages)
+            if self.stream_answers:
+                # Render completed markdown blocks while tokens arrive
+                return self._stream_answer_html(
+                    llm, messages, timings, has_context=True
+                )
+
+            with timings.span("llm_call"):
+                response = llm.invoke(messages, config=self._llm_run_config())
             answer = str(response.content).strip()
-            langfuse.flush()
 
-            print(f"[DEBUG] Generated contextual response: {answer[:100]}...")
+            logger.debug("Generated contextual response: %.100s...", answer)
 
             # Create formatted HTML answer from markdown
-            formatted_answer = self._format_html_answer(answer, has_context=True)
+            with timings.span("markdown_render"):
+                formatted_answer = self._format_html_answer(answer, has_context=True)
             return formatted_answer
 
         except Exception as e:
-            print(f"[DEBUG] Error in _generate_contextual_answer_html: {e}")
-
-            traceback.print_exc()
+            logger.exception("Error in _generate_contextual_answer_html: %s", e)
             return ""
 
-    def _generate_simple_answer_html(self, query: str) -> str:
+    def _generate_simple_answer_html(self, query: str, timings: QueryTimings) -> str:
         """Generate a simple LLM answer with markdown formatting (fallback)."""
-        print(f"[DEBUG] Generating simple markdown answer for: {query}")
+        logger.debug("Generating simple markdown answer for: %s", query)
 
         try:
             # Use the pre-initialized ChatOpenAI instance
             llm = self.llm
 
-            # Create simple messages - Updated to request markdown
-            messages = [
-                SystemMessage(
-                    content="""You are a helpful assistant that provides concise answers using Markdown formatting.
-                    Use Markdown syntax like **bold**, *italics*, bullet lists, and code blocks for better readability.
-                    Keep responses brief but well-formatted."""
-                ),
-                HumanMessage(
-                    content=f"Question: {query}\n\nProvide a brief, helpful answer using Markdown formatting:"
-                ),
-            ]
+            with timings.span("prompt_build"):
+                messages = self._build_simple_messages(query)
 
             # Generate response
-            response = llm.invoke(messages)
+            if self.stream_answers:
+                # Render completed markdown blocks while tokens arrive
+                return self._stream_answer_html(
+                    llm, messages, timings, has_context=False
+                )
+
+            with timings.span("llm_call"):
+                response = llm.invoke(messages, config=self._llm_run_config())
             answer = str(response.content).strip()
-            langfuse.flush()
 
-            print(f"[DEBUG] Generated simple response: {answer[:100]}...")
+            logger.debug("Generated simple response: %.100s...", answer)
 
             # Create formatted HTML answer from markdown
-            formatted_answer = self._format_html_answer(answer, has_context=False)
+            with timings.span("markdown_render"):
+                formatted_answer = self._format_html_answer(answer, has_context=False)
             return formatted_answer
 
         except Exception as e:
-            print(f"[DEBUG] Error in _generate_simple_answer_html: {e}")
-
-            traceback.print_exc()
+            logger.exception("Error in _generate_simple_answer_html: %s", e)
             return ""
 
+    def _build_contextual_messages(
+        self, query: str, search_context: list[dict]
+    ) -> list:
+        """Build the chat messages for an answer grounded in search results."""
+        # Prepare context from search results
+        context_text = self._format_search_context(search_context)
+
+        # Create messages with search context - Updated to request markdown
+        return [
+            SystemMessage(
+                content="""You are a helpful Search Engine assistant that provides accurate answers and sources based on search results.
+                    Use extractive summarization to identify key information from search results and avoid fillers.
+                    Identify the most important information and links from the search results.
+                    Format your response using Markdown syntax for better readability.
+                    Keep the response concise but well-formatted in Markdown."""
+            ),
+            HumanMessage(
+                content=f"""Query: {query}
+
+Search Results Context:
+{context_text}
+
+Based on the search results above, provide a helpful and accurate answer to the query using Markdown formatting. If the search results don't contain relevant information, say so and provide what general knowledge you can."""
+            ),
+        ]
+
+    def _build_simple_messages(self, query: str) -> list:
+        """Build the chat messages for the fallback answer without context."""
+        # Create simple messages - Updated to request markdown
+        return [
+            SystemMessage(
+                content="""You are a helpful assistant that provides concise answers using Markdown formatting.
+                    Use Markdown syntax like **bold**, *italics*, bullet lists, and code blocks for better readability.
+                    Keep responses brief but well-formatted."""
+            ),
+            HumanMessage(
+                content=f"Question: {query}\n\nProvide a brief, helpful answer using Markdown formatting:"
+            ),
+        ]
+
+    def _llm_run_config(self) -> dict:
+        """LangChain run config, attaching Langfuse tracing when there is room."""
+        if tracing_enabled and self.trace_flusher.admit():
+            return {"callbacks": [langchain_callback_handler]}
+        return {}
+
+    def _stream_answer_html(
+        self,
+        llm: ChatOpenAI,
+        messages: list,
+        timings: QueryTimings,
+        has_context: bool,
+        on_partial: typing.Optional[typing.Callable[[str], None]] = None,
+    ) -> str:
+        """Stream the LLM response, optionally rendering partial answers.
+
+        ``on_partial`` receives the HTML rendered so far every time a block
+        completes, so callers can push partial answers to the page. Those
+        blocks are converted one by one and miss cross-block state (reference
+        links, footnotes, unique heading ids), so the returned HTML is always
+        converted from the complete answer in one go.
+        """
+        renderer = None
+        if on_partial:
+
+            def convert(markdown_text: str) -> str:
+                with timings.span("markdown_render"):
+                    return self._convert_markdown(markdown_text)
+
+            renderer = IncrementalMarkdownRenderer(convert)
+
+        parts = []
+        with timings.span("llm_call"):
+            for chunk in llm.stream(messages, config=self._llm_run_config()):
+                text = str(chunk.content)
+                parts.append(text)
+                if renderer and renderer.feed(text):
+                    on_partial(renderer.html)
+        answer = "".join(parts).strip()
+
+        logger.debug("Streamed response: %.100s...", answer)
+
+        with timings.span("markdown_render"):
+            return self._format_html_answer(answer, has_context=has_context)
+
+    def _get_md_converter(self) -> markdown.Markdown:
+        """Return this thread's markdown converter, creating it on first use."""
+        converter = getattr(self._md_local, "converter", None)
+        if converter is None:
+            converter = markdown.Markdown(
+                extensions=MARKDOWN_EXTENSIONS,
+                extension_configs=MARKDOWN_EXTENSION_CONFIGS,
+            )
+            self._md_local.converter = converter
+        return converter
+
+    def _convert_markdown(self, markdown_text: str) -> str:
+        """Convert markdown to HTML with this thread's converter."""
+        md_converter = self._get_md_converter()
+        try:
+            return md_converter.convert(markdown_text)
+        finally:
+            # Reset the converter for the next use
+            md_converter.reset()
+
     def _format_html_answer(self, markdown_answer: str, has_context: bool) -> str:
         """
         Convert markdown answer to HTML.
@@ -329,13 +1449,9 @@ Based on the search results above, provide a helpful and accurate answer to the
         """
         try:
             # Convert markdown to HTML
-            html_content = self.md_converter.convert(markdown_answer)
-            # Reset the converter for the next use
-            self.md_converter.reset()
-            return html_content
+            return self._convert_markdown(markdown_answer)
         except Exception as e:
-            print(f"[DEBUG] Error in _format_html_answer: {e}")
-            traceback.print_exc()
+            logger.exception("Error in _format_html_answer: %s", e)
             # Fallback to the original text if markdown conversion fails
             return f"<div>{markdown_answer}</div>"
 
@@ -349,10 +1465,9 @@ Based on the search results above, provide a helpful and accurate answer to the
             context_parts.append(f"Result {i}:")
             context_parts.append(f"Title: {result.get('title', 'N/A')}")
 
+            # Content is already trimmed to the token budget by ContextPacker
             content = result.get("content", "")
             if content:
-                # Truncate content to avoid token limits
-                content = content[:300] + "..." if len(content) > 300 else content
                 context_parts.append(f"Content: {content}")
 
             source = result.get("engine", "Unknown")